@@ -1,8 +1,14 @@
 import argparse
+import atexit
 import sys
 from xplugin.plugin_manager import PluginManager
 from dotenv import load_dotenv
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from xplugin.tracing import xtracer
+from xplugin.profiler import xprofiler
+from xplugin.limits import xlimits
+from xplugin.config import ConfigError, ConfigWatcher, load_yaml, plugin_specs
 import os
 
 load_dotenv()
@@ -22,18 +28,32 @@ xsoc = {
 
 
 def load_config(config_path: str):
-    """Load configuration from a YAML file."""
-    import yaml
+    """Load and validate configuration from a YAML file."""
     try:
-        with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
-            xlogger.debug(f"Configuration loaded from {config_path}: {config}")
-            return config
-    except Exception as e:
+        config = load_yaml(config_path, "config")
+        xlogger.debug(f"Configuration loaded from {config_path}: {config}")
+        return config
+    except ConfigError as e:
         xlogger.error(f"Error loading configuration from {config_path}: {e}")
         return {}
 
 
+def load_startup_config(startup_path: str):
+    """Load and validate the startup file, which is optional."""
+    if not startup_path or not os.path.exists(startup_path):
+        xlogger.debug(f"No startup configuration at {startup_path}")
+        return {}
+    return load_yaml(startup_path, "startup")
+
+
+def apply_logging(config: dict):
+    if config.get("debug", False):
+        xlogger.setLevel("debug")
+        xlogger.debug("Debug mode is enabled")
+    else:
+        xlogger.setLevel("info")
+
+
 def main(config_path: str, plugin: str = None):
     
     config_file_path = os.getenv("XSOC_CONFIG_PATH", "config.yaml")
@@ -41,36 +61,67 @@ def main(config_path: str, plugin: str = None):
         config_file_path = config_path
     xlogger.info(f"Loading configuration from {config_file_path}")
     config = load_config(config_file_path)
+    apply_logging(config)
 
-    if config.get("debug", False):
-        xlogger.setLevel("debug")
-        xlogger.debug("Debug mode is enabled")
-    else:
-        xlogger.setLevel("info")
+    metrics_config = config.get("metrics", {})
+    xmetrics.configure(path=metrics_config.get("path"), flush_interval=metrics_config.get("flush_interval", 5.0))
+    xmetrics.start_exporter()
+
+    tracing_config = config.get("tracing", {})
+    xtracer.configure(
+        enabled=tracing_config.get("enabled", True),
+        path=tracing_config.get("path"),
+        buffer_size=tracing_config.get("buffer_size", 1000),
+    )
+    xprofiler.configure(path=tracing_config.get("profile_path"))
+    xprofiler.register("xsoc")
+    atexit.register(xprofiler.unregister)
+
+    limits_config = config.get("limits", {})
+    xlimits.configure(
+        path=limits_config.get("path"),
+        targets=limits_config.get("targets"),
+        poll_interval=limits_config.get("poll_interval"),
+    )
+
+    startup_path = config.get("startup_path", os.getenv("XSOC_STARTUP_PATH", "./example/plugin/startup.yaml"))
+    try:
+        startup_config = load_startup_config(startup_path)
+    except ConfigError as e:
+        xlogger.error(f"Error loading startup configuration: {e}")
+        startup_config = {}
 
-    plugins = []
-    for plugin_name, plugin_info in config.get("plugins", {}).items():
-        if plugin_info.get("enabled", True) is False:
-            xlogger.debug(f"Plugin {plugin_name} is disabled in configuration")
-        else:
-            plugins.append(
-                {
-                    "name": plugin_name,
-                    "builtin": plugin_info.get("builtin", False),
-                    "startup": plugin_info.get("startup", False),
-                }
-            )
-    
     manager = PluginManager()
+    manager.apply_plugin_specs(plugin_specs(config, startup_config))
 
-    for plugin in plugins:
-        xlogger.info(f"Running startup plugin: {plugin}")
-        manager.load_plugin(plugin["name"], builtin=plugin["builtin"])
+    reload_config = config.get("reload", {})
+    if not reload_config.get("watch", True):
+        manager.serve()
+        return
 
-    manager.load_startup_config('./example/plugin/startup.yaml')
-    manager.startup()
+    watcher = ConfigWatcher([config_file_path, startup_path], interval=reload_config.get("interval", 2.0))
+    watcher.start()
 
-    xlogger.debug(manager.plugins)       
+    def reload():
+        # Any error keeps the running configuration untouched
+        new_config = load_yaml(config_file_path, "config")
+        new_startup_path = new_config.get("startup_path", startup_path)
+        new_startup_config = load_startup_config(new_startup_path)
+        apply_logging(new_config)
+        new_limits_config = new_config.get("limits", {})
+        xlimits.configure(
+            path=new_limits_config.get("path"),
+            targets=new_limits_config.get("targets"),
+            poll_interval=new_limits_config.get("poll_interval"),
+        )
+        manager.apply_plugin_specs(plugin_specs(new_config, new_startup_config))
+        watcher.set_paths([config_file_path, new_startup_path])
+
+    try:
+        manager.serve(reload_event=watcher.reload_requested, on_reload=reload)
+    finally:
+        watcher.stop()
+        xlogger.debug(manager.plugins)       
         
 
 if __name__ == "__main__":
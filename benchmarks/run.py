@@ -0,0 +1,348 @@
+"""Offline benchmark suite for the plugin framework, workflow engine, cron and web paths.
+
+Run from the repository root::
+
+    python -m benchmarks.run                        # run and compare against benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline        # record a new baseline on this machine
+    python -m benchmarks.run --only workflow        # run benchmarks whose name contains "workflow"
+
+Every result is a time in seconds where lower is better. The run exits with
+status 1 when any result is slower than the baseline by more than the threshold.
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from xplugin.logger import xlogger  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BENCHMARKS = []
+
+
+def benchmark(name: str):
+    """Register a benchmark. The function returns a dict of result name -> seconds."""
+    def decorator(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return decorator
+
+
+def measure(func, number: int = 100, repeat: int = 5) -> float:
+    """Best-of-``repeat`` time per call over ``number`` calls, with GC paused like timeit."""
+    func()  # warm up caches and lazy imports
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return min(timings)
+
+
+class _Quiet:
+    """Silence the xsoc logger and stdout while a benchmark runs."""
+
+    def __init__(self, level: str = "info"):
+        self.level = level
+
+    def __enter__(self):
+        self._level = xlogger.logger.level
+        self._stdout = sys.stdout
+        self._streams = [(handler, handler.stream) for handler in xlogger.logger.handlers if hasattr(handler, "stream")]
+        for handler, _ in self._streams:
+            handler.stream = io.StringIO()
+        xlogger.setLevel(self.level)
+        sys.stdout = io.StringIO()
+        return self
+
+    def __exit__(self, *exc):
+        sys.stdout = self._stdout
+        for handler, stream in self._streams:
+            handler.stream = stream
+        xlogger.logger.setLevel(self._level)
+
+
+def _manager(*plugins):
+    from xplugin.plugin_manager import PluginManager
+    manager = PluginManager()
+    manager.plugins.clear()
+    for name, builtin in plugins:
+        manager.load_plugin(name, builtin=builtin)
+    return manager
+
+
+# Startup
+
+@benchmark("startup")
+def bench_startup():
+    """Import ``app`` in a fresh interpreter, with an empty and with a populated bytecode cache."""
+    results = {}
+    with tempfile.TemporaryDirectory() as cache:
+        env = {**os.environ, "PYTHONPYCACHEPREFIX": cache}
+        command = [sys.executable, "-c", "import app"]
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=env, check=True, capture_output=True)
+        results["import_app_cold"] = time.perf_counter() - start
+        warm = []
+        for _ in range(5):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT, env=env, check=True, capture_output=True)
+            warm.append(time.perf_counter() - start)
+        results["import_app_warm"] = statistics.median(warm)
+    return results
+
+
+# Plugin framework
+
+@benchmark("plugin_manager")
+def bench_plugin_manager():
+    from xplugin.plugin import Plugin
+    results = {}
+    with _Quiet():
+        manager = _manager()
+        for count in (10, 100, 1000):
+            manager.plugins.clear()
+            for index in range(count):
+                plugin = Plugin()
+                plugin.name = f"plugin_{index}"
+                manager.register_plugin(plugin)
+            # Loading (and registering) one more plugin next to ``count`` registered ones
+            results[f"load_plugin_{count}"] = measure(lambda: manager.load_plugin("hello_world"), number=200)
+            last = f"plugin_{count - 1}"
+            results[f"get_plugin_{count}"] = measure(lambda: manager.get_plugin(last), number=max(10, 10000 // count))
+        manager.plugins.clear()
+    return results
+
+
+# Workflow engine
+
+def _synthetic_workflow(steps: int) -> dict:
+    return {
+        "name": f"Synthetic {steps}",
+        "env": {"var1": "World"},
+        "steps": [
+            {
+                "name": f"step{index}",
+                "action": "tool",
+                "target": "concatenate_strings",
+                "parameters": ["{{ env.var1 }}" if index == 0 else f"{{{{ steps.step{index - 1} }}}}"],
+            }
+            for index in range(steps)
+        ],
+    }
+
+
+@benchmark("workflow")
+def bench_workflow():
+    from plugins.builtin.workflow import parse_workflow_config
+    results = {}
+    with _Quiet():
+        manager = _manager(("workflow", True), ("hello_world", False))
+        workflow_plugin = manager.get_plugin("workflow")
+        for file_name in sorted(os.listdir(os.path.join(ROOT, "example", "workflows"))):
+            workflow = parse_workflow_config(os.path.join(ROOT, "example", "workflows", file_name))
+            results[f"run_workflow_{os.path.splitext(file_name)[0]}"] = measure(
+                lambda: workflow_plugin.run_workflow(workflow), number=50)
+        synthetic = _synthetic_workflow(100)
+        results["run_workflow_synthetic_100_steps"] = measure(
+            lambda: workflow_plugin.run_workflow(synthetic), number=5)
+        manager.plugins.clear()
+    return results
+
+
+@benchmark("template")
+def bench_template():
+    import jinja2
+    context = {"env": {"var1": "World"}, "steps": {f"step{index}": "x" * 32 for index in range(100)}}
+    template = jinja2.Template("{{ steps.step99 }}")
+    return {
+        "template_compile_and_render": measure(lambda: jinja2.Template("{{ steps.step99 }}").render(context), number=200),
+        "template_render_precompiled": measure(lambda: template.render(context), number=2000),
+        "template_plain_string": measure(lambda: jinja2.Template("plain value").render(context), number=200),
+    }
+
+
+# Logging
+
+@benchmark("logger")
+def bench_logger():
+    results = {}
+    message = "Executing step: {'name': 'step1', 'action': 'tool'}"
+    with _Quiet(level="info"):
+        results["logger_debug_suppressed"] = measure(lambda: xlogger.debug(message), number=10000)
+        results["logger_info_emitted"] = measure(lambda: xlogger.info(message), number=500)
+    with _Quiet(level="debug"):
+        results["logger_debug_emitted"] = measure(lambda: xlogger.debug(message), number=500)
+    return results
+
+
+# Limits
+
+@benchmark("limits")
+def bench_limits():
+    """Uncontended cost of the shared limiter around a call."""
+    from xplugin.limits import Limiter
+    with tempfile.TemporaryDirectory() as path:
+        concurrency = Limiter("concurrency", os.path.join(path, "concurrency.lim"), max_concurrency=8)
+        rate = Limiter("rate", os.path.join(path, "rate.lim"), rate=1e9, burst=1e9)
+
+        def limited(limiter):
+            with limiter:
+                pass
+
+        return {
+            "limiter_concurrency_uncontended": measure(lambda: limited(concurrency), number=2000),
+            "limiter_rate_uncontended": measure(lambda: limited(rate), number=2000),
+        }
+
+
+# Cron
+
+@benchmark("cron")
+def bench_cron():
+    """Lag between a job's scheduled time and its dispatch, for jobs created through CronPlugin.
+
+    Ten jobs fire on every second, so the later ones also wait behind the
+    earlier ones of the same tick.
+    """
+    from apscheduler.events import EVENT_JOB_SUBMITTED
+    from datetime import datetime
+    from plugins.builtin.cron import CronPlugin
+    lags = []
+
+    def on_submitted(event):
+        for scheduled in event.scheduled_run_times:
+            lags.append((datetime.now(scheduled.tzinfo) - scheduled).total_seconds())
+
+    logging.getLogger("apscheduler").setLevel(logging.WARNING)
+    with _Quiet():
+        plugin = CronPlugin(built_in=True)
+        plugin.scheduler.add_listener(on_submitted, EVENT_JOB_SUBMITTED)
+        for index in range(10):
+            plugin.create_cron_job({
+                "name": f"bench_{index}",
+                "job": {"type": "tool", "target": "is_true", "params": {"value": True}},
+                "schedule": {"second": "*"},
+            })
+        plugin.scheduler.start()
+        deadline = time.monotonic() + 5.0
+        while len(lags) < 30 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        plugin.scheduler.shutdown(wait=True)
+    if not lags:
+        return {}
+    return {
+        "cron_dispatch_drift_median": statistics.median(lags),
+        "cron_dispatch_drift_max": max(lags),
+    }
+
+
+# Web
+
+@benchmark("web")
+def bench_web():
+    results = {}
+    with _Quiet():
+        manager = _manager(("web", True), ("workflow", True), ("hello_world", False))
+        workflow_plugin = manager.get_plugin("workflow")
+        workflow_plugin.create_workflow(os.path.join(ROOT, "example", "workflows", "test.yaml"))
+        client = manager.get_plugin("web").create_app().test_client()
+        for route in ("/", "/xplugin", "/metrics", "/workflow/Test Workflow"):
+            name = route.strip("/").split("/")[0] or "home"
+            results[f"web_get_{name}"] = measure(lambda: client.get(route), number=50)
+        manager.plugins.clear()
+    return results
+
+
+# Runner
+
+def run(only: str = None) -> dict:
+    results = {}
+    for name, func in BENCHMARKS:
+        if only and only not in name:
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            results.update(func())
+        except Exception as e:
+            print(f"  {name} failed: {e!r}", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return (name, baseline, current, ratio) for results slower than baseline by more than threshold."""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current / previous
+        if ratio > 1 + threshold:
+            regressions.append((name, previous, current, ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="XSOC benchmark suite")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before failing, e.g. 0.25 for 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--only", default=None, help="Only run benchmarks whose name contains this string")
+    args = parser.parse_args(argv)
+
+    results = run(args.only)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file).get("results", {})
+
+    for name, value in sorted(results.items()):
+        previous = baseline.get(name)
+        change = f"{(value / previous - 1) * 100:+7.1f}%" if previous else "    new"
+        print(f"{name:45s} {value * 1000:12.4f} ms  {change}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, previous, current, ratio in regressions:
+        print(f"REGRESSION {name}: {previous * 1000:.4f} ms -> {current * 1000:.4f} ms ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
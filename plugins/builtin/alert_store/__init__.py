@@ -0,0 +1,144 @@
+from xplugin.plugin import Plugin
+from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from plugins.builtin.alert_store.storage import EventStore
+import json
+import os
+import threading
+import time
+
+
+xlogger.debug("Alert Store Plugin module loaded.")
+
+_events_appended = xmetrics.counter("xsoc_alert_store_events_total", "Events appended to the alert store")
+_query_seconds = xmetrics.histogram("xsoc_alert_store_query_seconds", "Alert store lookup latency", ("field",))
+
+DEFAULT_FIELDS = {
+    "ip": ["src_ip", "dst_ip", "ip"],
+    "domain": ["domain"],
+    "hash": ["md5", "sha1", "sha256", "hash"],
+    "user": ["user", "username"],
+}
+
+
+class AlertStorePlugin(Plugin):
+    """Append-only store for the alerts and events processed by workflows.
+
+    Workflow steps can call it directly, e.g. ``alert_store.seen`` with
+    ``field: hash`` and ``value: "{{ steps.extract.sha256 }}"``.
+    """
+
+    def __init__(self, built_in: bool = False):
+        super().__init__(built_in)
+        self.description = "Time-partitioned alert and event store"
+        self.path = os.getenv("XSOC_ALERT_STORE_PATH", "./data/alerts")
+        self.fields = DEFAULT_FIELDS
+        self.time_field = "timestamp"
+        self.partition_hours = 24
+        self.segment_mb = 64
+        self.max_open_segments = 64
+        self.max_active_segments = 4
+        self.retention_days = None
+        self._store = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+
+    def load_config(self, config: dict):
+        self.configure(**config)
+        return [(self, {})]
+
+
+    def configure(self, path: str = None, fields: dict = None, time_field: str = None, partition_hours: float = None,
+                  segment_mb: int = None, max_open_segments: int = None, max_active_segments: int = None,
+                  retention_days: float = None, **kwargs):
+        """Apply plugin params from config.yaml or a startup file."""
+        self.path = path or self.path
+        self.fields = fields or self.fields
+        self.time_field = time_field or self.time_field
+        self.partition_hours = partition_hours or self.partition_hours
+        self.segment_mb = segment_mb or self.segment_mb
+        self.max_open_segments = max_open_segments or self.max_open_segments
+        self.max_active_segments = max_active_segments or self.max_active_segments
+        self.retention_days = retention_days if retention_days is not None else self.retention_days
+        if self._store is not None and self._pid == os.getpid():
+            self._store.close()
+        self._store = None
+
+
+    @property
+    def store(self) -> EventStore:
+        # Each process appends to its own segments; never reuse handles inherited through fork
+        if self._store is None or self._pid != os.getpid():
+            with self._lock:
+                if self._store is None or self._pid != os.getpid():
+                    self._store = EventStore(
+                        self.path,
+                        self.fields,
+                        time_field=self.time_field,
+                        partition_seconds=int(self.partition_hours * 3600),
+                        segment_bytes=int(self.segment_mb * 1024 * 1024),
+                        max_open_segments=self.max_open_segments,
+                        max_active_segments=self.max_active_segments,
+                        retention_days=self.retention_days,
+                    )
+                    self._pid = os.getpid()
+        return self._store
+
+
+    def run(self, **kwargs):
+        self.store.apply_retention()
+        return f"Alert Store Plugin is serving {self.path}"
+
+
+    def shutdown(self):
+        xlogger.debug("Shutting down Alert Store Plugin...")
+        self.process_exit()
+        return super().shutdown()
+
+
+    def process_exit(self):
+        # Seal this process's segments so other processes read them through the index
+        with self._lock:
+            if self._store is not None and self._pid == os.getpid():
+                self._store.close()
+                self._store = None
+
+
+    def append(self, event, **kwargs) -> float:
+        """Store one event. Accepts a dict or, from templated workflow parameters, a JSON string."""
+        if isinstance(event, str):
+            event = json.loads(event)
+        timestamp = self.store.append(event)
+        self.store.flush()
+        _events_appended.inc()
+        return timestamp
+
+
+    def append_many(self, events) -> int:
+        if isinstance(events, str):
+            events = json.loads(events)
+        count = self.store.append_many(events)
+        self.store.flush()
+        _events_appended.inc(count)
+        return count
+
+
+    def _since(self, days) -> float:
+        return time.time() - float(days) * 86400 if days not in (None, "", "None") else None
+
+
+    def seen(self, field: str, value, days: float = 30) -> bool:
+        """Whether an event with ``field == value`` was stored in the last ``days`` days."""
+        with _query_seconds.time(field=field):
+            return self.store.seen(field, value, since=self._since(days))
+
+
+    def search(self, field: str, value, days: float = None, limit: int = 100) -> list:
+        """Events with ``field == value``, optionally limited to the last ``days`` days."""
+        with _query_seconds.time(field=field):
+            return [event for _, event in self.store.query(field, value, since=self._since(days), limit=int(limit))]
+
+
+    def stats(self) -> dict:
+        return self.store.stats()
@@ -0,0 +1,703 @@
+"""Time-partitioned, append-only event storage.
+
+Layout under the store root::
+
+    <partition start epoch>/
+        seg-<pid>-<n>.log    length-prefixed JSON records
+        seg-<pid>-<n>.idx    sorted (key hash, offset) pairs for the indexed fields
+        seg-<pid>-<n>.meta   min/max event time, record count
+        seg-<pid>-<n>.pidx   index blocks published while the segment is still written
+
+Each process appends to its own active segment. Sealed segments are
+immutable and read through ``mmap``; their index is binary searched in place,
+so memory use does not grow with the amount of stored data. While a segment
+is active its writer appends a sorted index block to the ``.pidx`` file for
+every ``checkpoint_bytes`` or ``checkpoint_seconds`` of records, so other
+processes binary search those blocks and only parse the short unpublished
+tail. Segments left unsealed by processes that died are sealed by the next reader.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from xplugin.logger import xlogger
+
+
+RECORD_HEADER = struct.Struct("<Id")   # payload length, event timestamp
+INDEX_HEADER = struct.Struct("<4sQ")   # magic, entry count
+INDEX_ENTRY = struct.Struct("<QQ")     # key hash, record offset
+INDEX_MAGIC = b"XSIX"
+BLOCK_HEADER = struct.Struct("<4sIQdd")  # magic, entry count, log size covered, min/max event time
+BLOCK_MAGIC = b"XSPB"
+
+
+def key_hash(field: str, value) -> int:
+    """Stable 64-bit hash of an indexed field/value pair."""
+    data = f"{field}\x00{value}".encode("utf-8", "surrogatepass")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def get_path(event: dict, path: str):
+    value = event
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def parse_time(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def find_offsets(buffer, start: int, count: int, key: int):
+    """Offsets stored for ``key`` among ``count`` sorted index entries at ``start`` in ``buffer``."""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if INDEX_ENTRY.unpack_from(buffer, start + middle * INDEX_ENTRY.size)[0] < key:
+            low = middle + 1
+        else:
+            high = middle
+    while low < count:
+        entry_key, offset = INDEX_ENTRY.unpack_from(buffer, start + low * INDEX_ENTRY.size)
+        if entry_key != key:
+            return
+        yield offset
+        low += 1
+
+
+class Segment:
+    """A sealed, read-only segment accessed through mmap."""
+
+    def __init__(self, base: str, meta: dict):
+        self.base = base
+        self.meta = meta
+        self.min_time = meta["min_time"]
+        self.max_time = meta["max_time"]
+        self._data = None
+        self._index = None
+
+    def open(self):
+        if self._data is not None:
+            return
+        maps = []
+        for suffix in (".log", ".idx"):
+            with open(self.base + suffix, "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    maps.append(None)
+                else:
+                    maps.append(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        self._data, self._index = maps
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._data = self._index = None
+
+    def offsets(self, key: int):
+        if self._index is None:
+            return
+        magic, count = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Corrupt index {self.base}.idx")
+        yield from find_offsets(self._index, INDEX_HEADER.size, count, key)
+
+    def read(self, offset: int):
+        length, timestamp = RECORD_HEADER.unpack_from(self._data, offset)
+        start = offset + RECORD_HEADER.size
+        return timestamp, self._data[start:start + length]
+
+    def scan(self):
+        if self._data is None:
+            return
+        offset, end = 0, len(self._data)
+        while offset + RECORD_HEADER.size <= end:
+            length, timestamp = RECORD_HEADER.unpack_from(self._data, offset)
+            start = offset + RECORD_HEADER.size
+            yield timestamp, self._data[start:start + length]
+            offset = start + length
+
+
+class ActiveSegment:
+    """The segment this process is currently appending to, indexed in memory."""
+
+    def __init__(self, base: str, partition: int, checkpoint_bytes: int = 256 * 1024, checkpoint_seconds: float = 1.0):
+        self.base = base
+        self.partition = partition
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_seconds = checkpoint_seconds
+        self.file = open(base + ".log", "a+b")
+        self.size = self.file.tell()
+        self.index = {}
+        self.min_time = None
+        self.max_time = None
+        self.count = 0
+        self._pending = []        # (key hash, offset) pairs not yet published to the .pidx file
+        self._pending_times = None
+        self._published = self.size
+        self._published_at = time.monotonic()
+        self._blocks = None
+
+    def append(self, timestamp: float, payload: bytes, keys):
+        offset = self.size
+        self.file.write(RECORD_HEADER.pack(len(payload), timestamp))
+        self.file.write(payload)
+        self.size += RECORD_HEADER.size + len(payload)
+        for key in keys:
+            self.index.setdefault(key, []).append(offset)
+            self._pending.append((key, offset))
+        self.min_time = timestamp if self.min_time is None else min(self.min_time, timestamp)
+        self.max_time = timestamp if self.max_time is None else max(self.max_time, timestamp)
+        low, high = self._pending_times or (timestamp, timestamp)
+        self._pending_times = (min(low, timestamp), max(high, timestamp))
+        self.count += 1
+        if self.size - self._published >= self.checkpoint_bytes:
+            self.checkpoint()
+
+    def flush(self):
+        self.file.flush()
+        if self.size > self._published and time.monotonic() - self._published_at >= self.checkpoint_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Publish the index of the records appended since the last checkpoint as one sorted block."""
+        if self.size == self._published:
+            return
+        # Records must be readable before the block pointing at them
+        self.file.flush()
+        entries = sorted(self._pending)
+        block = bytearray(BLOCK_HEADER.pack(BLOCK_MAGIC, len(entries), self.size, *self._pending_times))
+        for key, offset in entries:
+            block += INDEX_ENTRY.pack(key, offset)
+        if self._blocks is None:
+            self._blocks = open(self.base + ".pidx", "ab")
+        self._blocks.write(block)
+        self._blocks.flush()
+        self._pending = []
+        self._pending_times = None
+        self._published = self.size
+        self._published_at = time.monotonic()
+
+    def read(self, offset: int):
+        header = os.pread(self.file.fileno(), RECORD_HEADER.size, offset)
+        length, timestamp = RECORD_HEADER.unpack(header)
+        return timestamp, os.pread(self.file.fileno(), length, offset + RECORD_HEADER.size)
+
+    def seal(self) -> dict:
+        """Write the index and metadata; the segment is immutable afterwards."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        write_index(self.base, ((key, offset) for key, offsets in self.index.items() for offset in offsets))
+        meta = {"min_time": self.min_time, "max_time": self.max_time, "count": self.count, "size": self.size}
+        write_meta(self.base, meta)
+        self.index = {}
+        self._pending = []
+        if self._blocks is not None:
+            self._blocks.close()
+            remove_published_blocks(self.base)
+        return meta
+
+
+class TailSegment:
+    """An unsealed segment of another live process.
+
+    The index blocks its writer has published are binary searched through
+    ``mmap``; only the records appended after the last block are parsed and
+    indexed in memory.
+    """
+
+    def __init__(self, base: str, keys):
+        self.base = base
+        self.keys = keys
+        self.file = open(base + ".log", "rb")
+        self.blocks = []       # (entries position in the .pidx map, entry count)
+        self.indexed = 0       # log bytes covered by the published blocks
+        self.size = 0          # log bytes covered by the blocks and the in-memory tail index
+        self.index = {}
+        self.min_time = None
+        self.max_time = None
+        self._block_file = None
+        self._map = None
+        self._block_end = 0
+
+    def _include(self, min_time: float, max_time: float):
+        self.min_time = min_time if self.min_time is None else min(self.min_time, min_time)
+        self.max_time = max_time if self.max_time is None else max(self.max_time, max_time)
+
+    def _refresh_blocks(self):
+        if self._block_file is None:
+            try:
+                self._block_file = open(self.base + ".pidx", "rb")
+            except FileNotFoundError:
+                return
+        if os.fstat(self._block_file.fileno()).st_size <= self._block_end:
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._block_file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._map)
+        while self._block_end + BLOCK_HEADER.size <= end:
+            magic, count, covered, min_time, max_time = BLOCK_HEADER.unpack_from(self._map, self._block_end)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"Corrupt index block in {self.base}.pidx")
+            start = self._block_end + BLOCK_HEADER.size
+            if start + count * INDEX_ENTRY.size > end:
+                break  # The writer is still writing this block
+            self.blocks.append((start, count))
+            self._include(min_time, max_time)
+            self.indexed = covered
+            self._block_end = start + count * INDEX_ENTRY.size
+        # Tail entries now covered by a block are looked up there instead
+        if self.indexed >= self.size:
+            self.index = {}
+            self.size = self.indexed
+        elif self.index:
+            self.index = {key: kept for key, offsets in self.index.items()
+                          if (kept := [offset for offset in offsets if offset >= self.indexed])}
+
+    def refresh(self):
+        """Pick up new index blocks, then index the records appended after them.
+
+        A partly written record waits for the next refresh.
+        """
+        self._refresh_blocks()
+        end = os.fstat(self.file.fileno()).st_size
+        if end <= self.size:
+            return
+        data = os.pread(self.file.fileno(), end - self.size, self.size)
+        position = 0
+        while position + RECORD_HEADER.size <= len(data):
+            length, timestamp = RECORD_HEADER.unpack_from(data, position)
+            start = position + RECORD_HEADER.size
+            if start + length > len(data):
+                break
+            try:
+                event = json.loads(data[start:start + length])
+            except ValueError:
+                break
+            for key in self.keys(event):
+                self.index.setdefault(key, []).append(self.size + position)
+            self._include(timestamp, timestamp)
+            position = start + length
+        self.size += position
+
+    def offsets(self, key: int):
+        for start, count in self.blocks:
+            yield from find_offsets(self._map, start, count, key)
+        yield from list(self.index.get(key, ()))
+
+    def read(self, offset: int):
+        header = os.pread(self.file.fileno(), RECORD_HEADER.size, offset)
+        length, timestamp = RECORD_HEADER.unpack(header)
+        return timestamp, os.pread(self.file.fileno(), length, offset + RECORD_HEADER.size)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._block_file is not None:
+            self._block_file.close()
+        self.file.close()
+
+
+def write_index(base: str, entries):
+    entries = sorted(entries)
+    # Per-process temporary names, so processes recovering the same segment never share a file
+    tmp = f"{base}.idx.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(entries)))
+        for key, offset in entries:
+            file.write(INDEX_ENTRY.pack(key, offset))
+    os.replace(tmp, base + ".idx")
+
+
+def remove_published_blocks(base: str):
+    # Only needed while the segment is unsealed; readers that still map it keep their copy
+    try:
+        os.remove(base + ".pidx")
+    except FileNotFoundError:
+        pass
+
+
+def write_meta(base: str, meta: dict):
+    # The meta file is written last and marks the segment as sealed
+    tmp = f"{base}.meta.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp, base + ".meta")
+
+
+class EventStore:
+    """Append events and look them up by indexed field over a time range."""
+
+    def __init__(self, path: str, fields: dict, time_field: str = "timestamp", partition_seconds: int = 86400,
+                 segment_bytes: int = 64 * 1024 * 1024, max_open_segments: int = 64, max_active_segments: int = 4,
+                 retention_days: float = None, retention_interval: float = 3600, checkpoint_bytes: int = 256 * 1024,
+                 checkpoint_seconds: float = 1.0):
+        self.path = path
+        # Logical field name -> list of event paths feeding it, e.g. {"ip": ["src_ip", "dst_ip"]}
+        self.fields = {name: [paths] if isinstance(paths, str) else list(paths) for name, paths in fields.items()}
+        self.time_field = time_field
+        self.partition_seconds = int(partition_seconds)
+        self.segment_bytes = segment_bytes
+        self.max_open_segments = max_open_segments
+        self.max_active_segments = max_active_segments
+        self.retention_days = retention_days
+        self.retention_interval = retention_interval
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_seconds = checkpoint_seconds
+        self._retention_at = None
+        self._lock = threading.RLock()
+        self._active = OrderedDict()       # partition -> ActiveSegment, so late events do not force a seal
+        self._sequence = 0
+        self._sealed = {}                  # base path -> Segment, metadata only
+        self._open_segments = OrderedDict()  # LRU of segments with live mmaps
+        self._tails = {}                   # base path -> TailSegment of another live process
+        os.makedirs(self.path, exist_ok=True)
+        self.recover()
+        self._apply_retention_due()
+
+    # Writing
+
+    def _keys(self, event: dict):
+        keys = set()
+        for name, paths in self.fields.items():
+            for path in paths:
+                value = get_path(event, path)
+                values = value if isinstance(value, list) else [value]
+                for item in values:
+                    if item is not None and item != "":
+                        keys.add(key_hash(name, item))
+        return keys
+
+    def _partition(self, timestamp: float) -> int:
+        return int(timestamp // self.partition_seconds) * self.partition_seconds
+
+    def _new_segment(self, partition: int) -> ActiveSegment:
+        directory = os.path.join(self.path, str(partition))
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            self._sequence += 1
+            base = os.path.join(directory, f"seg-{os.getpid()}-{self._sequence}")
+            if not os.path.exists(base + ".log"):
+                return ActiveSegment(base, partition, self.checkpoint_bytes, self.checkpoint_seconds)
+
+    def append(self, event: dict) -> float:
+        """Append one event and return its timestamp."""
+        timestamp = parse_time(get_path(event, self.time_field))
+        payload = json.dumps(event, separators=(",", ":"), default=str).encode()
+        keys = self._keys(event)
+        partition = self._partition(timestamp)
+        with self._lock:
+            active = self._active.get(partition)
+            if active is not None and active.size >= self.segment_bytes:
+                self._seal_active(partition)
+                active = None
+            if active is None:
+                self._apply_retention_due()
+                while len(self._active) >= self.max_active_segments:
+                    self._seal_active(next(iter(self._active)))
+                active = self._active[partition] = self._new_segment(partition)
+            else:
+                self._active.move_to_end(partition)
+            active.append(timestamp, payload, keys)
+        return timestamp
+
+    def append_many(self, events) -> int:
+        count = 0
+        for event in events:
+            self.append(event)
+            count += 1
+        return count
+
+    def _seal_active(self, partition: int):
+        active = self._active.pop(partition, None)
+        if active is None:
+            return
+        if active.count == 0:
+            active.file.close()
+            os.remove(active.base + ".log")
+            return
+        meta = active.seal()
+        self._sealed[active.base] = Segment(active.base, meta)
+        xlogger.debug(f"Sealed segment {active.base} with {meta['count']} events")
+
+    def flush(self):
+        with self._lock:
+            for active in self._active.values():
+                active.flush()
+
+    def seal(self):
+        with self._lock:
+            for partition in list(self._active):
+                self._seal_active(partition)
+
+    def close(self):
+        with self._lock:
+            self.seal()
+            for segment in self._open_segments.values():
+                segment.close()
+            self._open_segments.clear()
+            for tail in self._tails.values():
+                tail.close()
+            self._tails.clear()
+
+    # Recovery and retention
+
+    def recover(self):
+        """Seal segments left behind by processes that exited without closing them."""
+        for partition in self._partitions():
+            directory = os.path.join(self.path, str(partition))
+            for file_name in os.listdir(directory):
+                if not file_name.endswith(".log"):
+                    continue
+                base = os.path.join(directory, file_name[:-4])
+                if os.path.exists(base + ".meta"):
+                    continue
+                writer = self._writer(file_name)
+                if writer is None or writer == os.getpid():
+                    self._rebuild(base)
+
+    @staticmethod
+    def _writer(file_name: str):
+        """Pid of the live process appending to a segment, None once it has exited."""
+        try:
+            pid = int(file_name.split("-")[1])
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except (ValueError, IndexError):
+            return -1  # Not one of ours, leave it alone
+        except PermissionError:
+            pass
+        return pid
+
+    def _rebuild(self, base: str):
+        with open(base + ".log", "r+b") as lock:
+            # Readers in several processes may find the same dead segment; the first one seals it
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(base + ".meta"):
+                    self._rebuild_locked(base)
+            finally:
+                fcntl.lockf(lock, fcntl.LOCK_UN)
+
+    def _rebuild_locked(self, base: str):
+        xlogger.warning(f"Rebuilding index for unsealed segment {base}")
+        segment = Segment(base, {"min_time": 0, "max_time": 0})
+        with open(base + ".log", "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                write_index(base, [])
+                write_meta(base, {"min_time": 0, "max_time": 0, "count": 0, "size": 0})
+                remove_published_blocks(base)
+                return
+            segment._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        entries, min_time, max_time, count, offset = [], None, None, 0, 0
+        try:
+            for timestamp, payload in segment.scan():
+                try:
+                    event = json.loads(bytes(payload))
+                except ValueError:
+                    break  # Torn write at the end of the file
+                for key in self._keys(event):
+                    entries.append((key, offset))
+                min_time = timestamp if min_time is None else min(min_time, timestamp)
+                max_time = timestamp if max_time is None else max(max_time, timestamp)
+                count += 1
+                offset += RECORD_HEADER.size + len(payload)
+        finally:
+            segment.close()
+        os.truncate(base + ".log", offset)
+        write_index(base, entries)
+        write_meta(base, {"min_time": min_time or 0, "max_time": max_time or 0, "count": count, "size": offset})
+        remove_published_blocks(base)
+
+    def _apply_retention_due(self):
+        """Apply retention when the store opens and then every ``retention_interval`` seconds, checked on new segments."""
+        if not self.retention_days:
+            return
+        now = time.monotonic()
+        if self._retention_at is not None and now - self._retention_at < self.retention_interval:
+            return
+        self._retention_at = now
+        removed = self.apply_retention()
+        if removed:
+            xlogger.info(f"Alert store retention removed {removed} partitions older than {self.retention_days} days")
+
+    def apply_retention(self):
+        """Delete whole partitions older than the retention window."""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        removed = 0
+        with self._lock:
+            for partition in self._partitions():
+                if partition + self.partition_seconds > cutoff:
+                    continue
+                self._seal_active(partition)
+                directory = os.path.join(self.path, str(partition))
+                for file_name in os.listdir(directory):
+                    base = os.path.join(directory, file_name.rsplit(".", 1)[0])
+                    segment = self._open_segments.pop(base, None)
+                    if segment:
+                        segment.close()
+                    self._sealed.pop(base, None)
+                    self._drop_tail(base)
+                    os.remove(os.path.join(directory, file_name))
+                os.rmdir(directory)
+                removed += 1
+        return removed
+
+    # Reading
+
+    def _partitions(self):
+        partitions = []
+        for name in os.listdir(self.path):
+            if name.lstrip("-").isdigit() and os.path.isdir(os.path.join(self.path, name)):
+                partitions.append(int(name))
+        return sorted(partitions)
+
+    def _segments(self, since: float, until: float):
+        """Segments whose time bounds overlap [since, until], newest partition first.
+
+        Sealed segments are yielded along with the unsealed segments other
+        live processes are appending to. Unsealed segments whose writer has
+        exited are sealed on the way.
+        """
+        own = {active.base for active in self._active.values()}
+        for partition in reversed(self._partitions()):
+            if partition + self.partition_seconds <= since or partition > until:
+                continue
+            directory = os.path.join(self.path, str(partition))
+            names = os.listdir(directory)
+            sealed = {name[:-5] for name in names if name.endswith(".meta")}
+            for name in names:
+                if not name.endswith(".log") or name[:-4] in sealed:
+                    continue
+                base = os.path.join(directory, name[:-4])
+                if base in own:
+                    continue
+                writer = self._writer(name)
+                if writer is None:
+                    self._drop_tail(base)
+                    self._rebuild(base)
+                    sealed.add(name[:-4])
+                    continue
+                if writer == -1:
+                    continue
+                tail = self._tails.get(base)
+                if tail is None:
+                    try:
+                        tail = self._tails[base] = TailSegment(base, self._keys)
+                    except OSError:
+                        continue
+                tail.refresh()
+                if tail.max_time is not None and tail.max_time >= since and tail.min_time <= until:
+                    yield tail
+            for stem in sorted(sealed, reverse=True):
+                base = os.path.join(directory, stem)
+                self._drop_tail(base)
+                segment = self._sealed.get(base)
+                if segment is None:
+                    try:
+                        with open(base + ".meta", "r") as file:
+                            segment = Segment(base, json.load(file))
+                    except (OSError, ValueError):
+                        continue
+                    self._sealed[base] = segment
+                if segment.max_time < since or segment.min_time > until:
+                    continue
+                yield segment
+
+    def _drop_tail(self, base: str):
+        tail = self._tails.pop(base, None)
+        if tail is not None:
+            tail.close()
+
+    def _opened(self, segment: Segment) -> Segment:
+        if segment.base in self._open_segments:
+            self._open_segments.move_to_end(segment.base)
+            return segment
+        segment.open()
+        self._open_segments[segment.base] = segment
+        while len(self._open_segments) > self.max_open_segments:
+            _, evicted = self._open_segments.popitem(last=False)
+            evicted.close()
+        return segment
+
+    def _matches(self, event: dict, field: str, value) -> bool:
+        value = str(value)
+        for path in self.fields.get(field, [field]):
+            found = get_path(event, path)
+            values = found if isinstance(found, list) else [found]
+            if any(item is not None and str(item) == value for item in values):
+                return True
+        return False
+
+    def query(self, field: str, value, since: float = None, until: float = None, limit: int = 1000) -> list:
+        """Return ``(timestamp, event)`` pairs whose ``field`` equals ``value`` in the time range."""
+        if field not in self.fields:
+            raise ValueError(f"Field {field} is not indexed")
+        since = float("-inf") if since is None else since
+        until = float("inf") if until is None else until
+        matches = []
+        with self._lock:
+            for timestamp, event in self._iter_matches(field, value, since, until):
+                matches.append((timestamp, event))
+                if limit and len(matches) >= limit:
+                    break
+        return matches
+
+    def _iter_matches(self, field: str, value, since: float, until: float):
+        key = key_hash(field, value)
+        for active in list(self._active.values()):
+            if active.max_time >= since and active.min_time <= until:
+                active.file.flush()
+                yield from self._read_matches(active.read, list(active.index.get(key, ())), field, value, since, until)
+        for segment in self._segments(since, until):
+            if isinstance(segment, TailSegment):
+                yield from self._read_matches(segment.read, segment.offsets(key), field, value, since, until)
+                continue
+            # Read each segment right after mapping it so LRU eviction cannot close it underneath us
+            segment = self._opened(segment)
+            yield from self._read_matches(segment.read, segment.offsets(key), field, value, since, until)
+
+    def _read_matches(self, read, offsets, field: str, value, since: float, until: float):
+        for offset in offsets:
+            timestamp, payload = read(offset)
+            if timestamp < since or timestamp > until:
+                continue
+            event = json.loads(bytes(payload))
+            # Index keys are hashes, so confirm the actual value
+            if self._matches(event, field, value):
+                yield timestamp, event
+
+    def seen(self, field: str, value, since: float = None, until: float = None) -> bool:
+        return bool(self.query(field, value, since=since, until=until, limit=1))
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = [segment for segment in self._segments(float("-inf"), float("inf")) if isinstance(segment, Segment)]
+            return {
+                "partitions": len(self._partitions()),
+                "segments": len(segments),
+                "events": sum(segment.meta.get("count", 0) for segment in segments) + sum(active.count for active in self._active.values()),
+                "open_segments": len(self._open_segments),
+            }
@@ -1,10 +1,19 @@
 from xplugin.plugin import Plugin
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from datetime import datetime
+import time
 import plugins.builtin.workflow.tools  as tools
 import os
 
 
+_cron_dispatch_lag = xmetrics.histogram("xsoc_cron_dispatch_lag_seconds", "Delay between a job's scheduled time and its submission", ("job",))
+_cron_executions = xmetrics.counter("xsoc_cron_executions_total", "Cron job executions by outcome", ("job", "status"))
+_cron_jobs = xmetrics.gauge("xsoc_cron_jobs_scheduled", "Number of jobs held by the scheduler")
+
+
 class CronPlugin(Plugin):
 
     separate_process = True
@@ -15,7 +24,25 @@ class CronPlugin(Plugin):
         super().__init__(built_in)
         self.description = "A plugin to manage cron jobs"
         self.scheduler = BackgroundScheduler()
+        self.scheduler.add_listener(self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
         self.continuous_run = True
+        self.job_names = {}
+
+
+    def _on_job_event(self, event):
+        """Record dispatch lag and outcome of scheduler jobs."""
+        job_name = self.job_names.get(event.job_id, event.job_id)
+        if event.code == EVENT_JOB_SUBMITTED:
+            for scheduled in event.scheduled_run_times:
+                lag = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+                _cron_dispatch_lag.observe(max(lag, 0.0), job=job_name)
+            return
+        status = {EVENT_JOB_EXECUTED: "ok", EVENT_JOB_ERROR: "error", EVENT_JOB_MISSED: "missed"}[event.code]
+        _cron_executions.inc(job=job_name, status=status)
+        history = self.plugin_manager.get_history_store() if hasattr(self, 'plugin_manager') else None
+        if history:
+            history.record_cron_execution(job_name, event.scheduled_run_time.timestamp(), time.time(), status,
+                                          error=repr(event.exception) if getattr(event, 'exception', None) else None)
 
 
     def parse_cron_config(self, config_path: str):
@@ -51,13 +78,15 @@ class CronPlugin(Plugin):
             xlogger.debug("Starting Cron Plugin scheduler...")
             self.scheduler.start()
             self.started = True
+            _cron_jobs.set(len(self.scheduler.get_jobs()))
             xlogger.debug("Cron Plugin scheduler started.")
         try:
-            while not self.shutdown_event.is_set():
+            while not self.wait_or_shutdown(timeout=1.0):
                 pass
+            xlogger.debug("Shutdown requested, stopping Cron Plugin scheduler...")
         except KeyboardInterrupt:
             xlogger.debug("KeyboardInterrupt received in Cron Plugin, shutting down...")
-            self.shutdown()
+        self.shutdown()
     
     def create_cron_job(self, job_config):
         xlogger.debug(f"Creating cron job with config: {job_config}")
@@ -67,10 +96,11 @@ class CronPlugin(Plugin):
                 xlogger.debug("Cron job is disabled, skipping creation.")
                 return None
             # xlogger.debug(f"Creating cron job: {job_config['job']['params']}")
+            job = None
             if job_config['job']['type'] == 'tool':
-                self.scheduler.add_job(func=getattr(tools, job_config['job']['target']), trigger='cron', **job_config['schedule'], args=[], kwargs=job_config['job'].get('params', {}))
+                job = self.scheduler.add_job(func=getattr(tools, job_config['job']['target']), trigger='cron', **job_config['schedule'], args=[], kwargs=job_config['job'].get('params', {}))
             elif job_config['job']['type'] == 'function':
-                self.scheduler.add_job(func=globals()[job_config['job']['target']], trigger='cron', **job_config['schedule'], args=[], kwargs=job_config['job'].get('params', {}))
+                job = self.scheduler.add_job(func=globals()[job_config['job']['target']], trigger='cron', **job_config['schedule'], args=[], kwargs=job_config['job'].get('params', {}))
             elif job_config['job']['type'] == 'workflow':
                 xlogger.debug("Creating cron job for workflow")
                 workflow_plugin = self.plugin_manager.get_plugin('workflow')
@@ -80,10 +110,13 @@ class CronPlugin(Plugin):
                     workflow = workflow_plugin.get_workflow(job_config['job']['target'])
                     xlogger.debug(f"Scheduling workflow: {workflow}")
                     if workflow:
-                        self.scheduler.add_job(func=workflow_plugin.run_workflow, trigger='cron', **job_config['schedule'], args=[workflow], kwargs=job_config['job'].get('params', {}))
+                        # Scheduled by name so every run starts from a fresh copy of the definition
+                        job = self.scheduler.add_job(func=workflow_plugin.run_workflow, trigger='cron', **job_config['schedule'], args=[workflow['name']], kwargs=job_config['job'].get('params', {}))
             else:
                 xlogger.error(f"Unknown job type: {job_config['job']['type']}")
                 raise ValueError(f"Unknown job type: {job_config['job']['type']}")
+            if job:
+                self.job_names[job.id] = job_config.get('name', job.id)
             xlogger.debug(f"Cron job created with config: {job_config}")
             return job_config
         except Exception as e:
@@ -0,0 +1,416 @@
+from xplugin.plugin import Plugin
+from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from contextlib import contextmanager
+import os
+import queue
+import reprlib
+import sqlite3
+import threading
+import time
+
+
+xlogger.debug("Database Plugin module loaded.")
+
+_db_queue_depth = xmetrics.gauge("xsoc_db_write_queue_depth", "Records waiting for the background writer")
+_db_batch_size = xmetrics.histogram("xsoc_db_write_batch_size", "Records written per transaction", buckets=(1, 5, 10, 50, 100, 500, 1000, 5000))
+_db_batch_seconds = xmetrics.histogram("xsoc_db_write_batch_seconds", "Time spent committing one batch")
+_db_dropped = xmetrics.counter("xsoc_db_records_dropped_total", "Records dropped because the write queue was full")
+
+_result_repr = reprlib.Repr()
+_result_repr.maxlevel = 4
+_result_repr.maxdict = _result_repr.maxlist = _result_repr.maxtuple = _result_repr.maxset = 50
+_result_repr.maxstring = _result_repr.maxother = 1024
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS workflow_runs (
+        run_id TEXT PRIMARY KEY,
+        workflow TEXT NOT NULL,
+        status TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        finished_at REAL,
+        duration REAL,
+        trace_id TEXT,
+        error TEXT,
+        pid INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS step_results (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL,
+        workflow TEXT NOT NULL,
+        step TEXT NOT NULL,
+        action TEXT,
+        target TEXT,
+        status TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        duration REAL,
+        result TEXT,
+        error TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS cron_executions (
+        id INTEGER PRIMARY KEY,
+        job TEXT NOT NULL,
+        scheduled_at REAL,
+        finished_at REAL NOT NULL,
+        lag REAL,
+        status TEXT NOT NULL,
+        error TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS plugin_events (
+        id INTEGER PRIMARY KEY,
+        plugin TEXT NOT NULL,
+        event TEXT NOT NULL,
+        pid INTEGER,
+        created_at REAL NOT NULL,
+        detail TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_runs_workflow_time ON workflow_runs (workflow, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_status_time ON workflow_runs (status, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_time ON workflow_runs (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_steps_run ON step_results (run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_steps_time ON step_results (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_cron_job_time ON cron_executions (job, finished_at)",
+    "CREATE INDEX IF NOT EXISTS idx_cron_time ON cron_executions (finished_at)",
+    "CREATE INDEX IF NOT EXISTS idx_events_plugin_time ON plugin_events (plugin, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_events_time ON plugin_events (created_at)",
+]
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them
+INSERT_RUN = ("INSERT OR REPLACE INTO workflow_runs (run_id, workflow, status, started_at, finished_at, duration, trace_id, error, pid) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+INSERT_STEP = ("INSERT INTO step_results (run_id, workflow, step, action, target, status, started_at, duration, result, error) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+INSERT_CRON = ("INSERT INTO cron_executions (job, scheduled_at, finished_at, lag, status, error) "
+               "VALUES (?, ?, ?, ?, ?, ?)")
+INSERT_EVENT = "INSERT INTO plugin_events (plugin, event, pid, created_at, detail) VALUES (?, ?, ?, ?, ?)"
+
+# Tables and the time column used by the retention policy
+RETENTION = {
+    "workflow_runs": "started_at",
+    "step_results": "started_at",
+    "cron_executions": "finished_at",
+    "plugin_events": "created_at",
+}
+
+_STOP = object()
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared between threads."""
+
+    def __init__(self, path: str, size: int = 4, timeout: float = 5.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        # Only takes effect before the first table is created, so it goes ahead of everything else
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+class DatabasePlugin(Plugin):
+    """Embedded SQLite store for workflow, cron and plugin history.
+
+    Writes are queued and committed in batches by a background thread, so
+    recording history never puts a disk sync on the caller's path.
+    """
+
+    def __init__(self, built_in: bool = False):
+        super().__init__(built_in)
+        self.description = "Embedded run-history store"
+        self.path = os.getenv("XSOC_DATABASE_PATH", "xsoc.db")
+        self.pool_size = 4
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.max_queue = 100000
+        self.retention_days = 30
+        self.compact_interval = 3600
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pool = None
+        self._inherited = []  # Pools of a parent process, kept so they are never closed from a forked child
+        self._queue = None
+        self._writer = None
+        self._stopped = False  # set by shutdown(), so a stopped instance never starts a new writer
+
+
+    def load_config(self, config: dict):
+        self.configure(**config)
+        return [(self, {})]
+
+
+    def configure(self, path: str = None, pool_size: int = None, batch_size: int = None, flush_interval: float = None,
+                  max_queue: int = None, retention_days: int = None, compact_interval: float = None, **kwargs):
+        """Apply plugin params from config.yaml or a startup file."""
+        if path and path != self.path and self._pid == os.getpid() and self.pool is not None:
+            # Records already committed stay in the old file, later ones go to the new one
+            self.shutdown()
+            self._stopped = False
+        self.path = path or self.path
+        self.pool_size = pool_size or self.pool_size
+        self.batch_size = batch_size or self.batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else self.flush_interval
+        self.max_queue = max_queue or self.max_queue
+        self.retention_days = retention_days if retention_days is not None else self.retention_days
+        self.compact_interval = compact_interval or self.compact_interval
+
+
+    def run(self, **kwargs):
+        self._ensure_started()
+        return f"Database Plugin is serving {self.path}"
+
+
+    def _ensure_started(self):
+        # The writer thread does not survive fork, so every process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.pool is not None:
+                # Closing or collecting inherited connections would disturb the parent's, so they stay unused
+                self._inherited.append(self.pool)
+            self.pool = None
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._writer = threading.Thread(target=self._writer_loop, name="xsoc-db-writer", daemon=True)
+            self._pid = os.getpid()
+            self._writer.start()
+
+
+    def _get_pool(self) -> ConnectionPool:
+        # Opened on first use so that configure() can still change the path after loading
+        self._ensure_started()
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    xlogger.debug(f"Opening database at {self.path}")
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    pool = ConnectionPool(self.path, self.pool_size)
+                    with pool.connection() as conn:
+                        with conn:
+                            for statement in SCHEMA:
+                                conn.execute(statement)
+                        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                            # Files created without incremental auto_vacuum are converted once
+                            xlogger.info(f"Enabling incremental vacuum on {self.path}")
+                            conn.execute("VACUUM")
+                    self.pool = pool
+        return self.pool
+
+
+    # Background writer
+
+    def _enqueue(self, statement: str, params: tuple):
+        if self._stopped:
+            xlogger.debug("Database plugin is stopped, dropping record")
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((statement, params))
+        except queue.Full:
+            _db_dropped.inc()
+            xlogger.warning("Database write queue is full, dropping record")
+
+
+    def _writer_loop(self):
+        last_compaction = time.monotonic()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # A stop or flush marker commits what has been collected without waiting
+            while item is not _STOP and not isinstance(item, threading.Event) and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            _db_queue_depth.set(self._queue.qsize())
+            if time.monotonic() - last_compaction > self.compact_interval:
+                last_compaction = time.monotonic()
+                self.compact()
+            if any(item is _STOP for item in batch):
+                return
+
+
+    def _write_batch(self, batch: list):
+        grouped = {}
+        waiters = []
+        for item in batch:
+            if item is _STOP:
+                continue
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                continue
+            statement, params = item
+            grouped.setdefault(statement, []).append(params)
+        start = time.perf_counter()
+        try:
+            if grouped:
+                with self._get_pool().connection() as conn:
+                    with conn:
+                        for statement, rows in grouped.items():
+                            conn.executemany(statement, rows)
+                _db_batch_size.observe(sum(len(rows) for rows in grouped.values()))
+                _db_batch_seconds.observe(time.perf_counter() - start)
+        except Exception as e:
+            xlogger.error(f"Error writing batch of {len(batch)} records: {e}")
+        finally:
+            for waiter in waiters:
+                waiter.set()
+
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything queued so far has been committed."""
+        if self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+
+    def shutdown(self):
+        xlogger.debug("Shutting down Database Plugin...")
+        self._stopped = True
+        if self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=10.0)
+            if self.pool:
+                self.pool.close()
+            self.pool = None
+            self._pid = None
+        return super().shutdown()
+
+
+    # Recording
+
+    def record_workflow_run(self, run_id: str, workflow: str, status: str, started_at: float, finished_at: float = None,
+                            trace_id: str = None, error: str = None):
+        duration = finished_at - started_at if finished_at else None
+        self._enqueue(INSERT_RUN, (run_id, workflow, status, started_at, finished_at, duration, trace_id, error, os.getpid()))
+
+
+    def record_step_result(self, run_id: str, workflow: str, step: str, action: str, target: str, status: str,
+                           started_at: float, duration: float, result=None, error: str = None, max_result_size: int = 1024):
+        if result is not None:
+            # Large results are abbreviated while formatting instead of formatted in full and cut
+            result = result[:max_result_size] if isinstance(result, str) else _result_repr.repr(result)[:max_result_size]
+        self._enqueue(INSERT_STEP, (run_id, workflow, step, action, target, status, started_at, duration, result, error))
+
+
+    def record_cron_execution(self, job: str, scheduled_at: float, finished_at: float, status: str, error: str = None):
+        lag = finished_at - scheduled_at if scheduled_at else None
+        self._enqueue(INSERT_CRON, (job, scheduled_at, finished_at, lag, status, error))
+
+
+    def record_plugin_event(self, plugin: str, event: str, detail: str = None):
+        self._enqueue(INSERT_EVENT, (plugin, event, os.getpid(), time.time(), detail))
+
+
+    # Queries
+
+    def _query(self, statement: str, params: tuple = ()) -> list:
+        with self._get_pool().connection() as conn:
+            return [dict(row) for row in conn.execute(statement, params)]
+
+
+    def get_runs(self, workflow: str = None, status: str = None, since: float = None, until: float = None, limit: int = 100) -> list:
+        """Most recent workflow runs, optionally filtered by workflow, status and time range."""
+        clauses, params = [], []
+        if workflow:
+            clauses.append("workflow = ?")
+            params.append(workflow)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        return self._query(f"SELECT * FROM workflow_runs {where}ORDER BY started_at DESC LIMIT ?", (*params, limit))
+
+
+    def get_run_steps(self, run_id: str) -> list:
+        return self._query("SELECT * FROM step_results WHERE run_id = ? ORDER BY started_at", (run_id,))
+
+
+    def get_cron_executions(self, job: str = None, limit: int = 100) -> list:
+        if job:
+            return self._query("SELECT * FROM cron_executions WHERE job = ? ORDER BY finished_at DESC LIMIT ?", (job, limit))
+        return self._query("SELECT * FROM cron_executions ORDER BY finished_at DESC LIMIT ?", (limit,))
+
+
+    def get_plugin_events(self, plugin: str = None, limit: int = 100) -> list:
+        if plugin:
+            return self._query("SELECT * FROM plugin_events WHERE plugin = ? ORDER BY created_at DESC LIMIT ?", (plugin, limit))
+        return self._query("SELECT * FROM plugin_events ORDER BY created_at DESC LIMIT ?", (limit,))
+
+
+    # Retention
+
+    def compact(self):
+        """Delete rows past the retention window and give the space back to the filesystem."""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        try:
+            with self._get_pool().connection() as conn:
+                with conn:
+                    for table, column in RETENTION.items():
+                        conn.execute(f"DELETE FROM {table} WHERE {column} < ?", (cutoff,))
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.execute("PRAGMA incremental_vacuum")
+            xlogger.debug(f"Database compacted, removed history older than {self.retention_days} days")
+        except Exception as e:
+            xlogger.error(f"Error compacting database: {e}")
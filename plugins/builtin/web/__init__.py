@@ -2,11 +2,19 @@ from xplugin.plugin import Plugin
 from flask import Flask, url_for, request
 from jinja2 import Template
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from xplugin.tracing import xtracer
+from xplugin.profiler import xprofiler
 import logging
 import os
+import time
 
 xlogger.debug("Web Plugin module loaded.")
 
+_http_requests = xmetrics.counter("xsoc_http_requests_total", "HTTP requests served", ("method", "route", "status"))
+_http_request_seconds = xmetrics.histogram("xsoc_http_request_seconds", "HTTP request latency", ("method", "route"))
+_http_in_flight = xmetrics.gauge("xsoc_http_requests_in_flight", "HTTP requests currently being served")
+
 class WebPlugin(Plugin):
 
     def __init__(self, built_in: bool = False):
@@ -16,6 +24,7 @@ class WebPlugin(Plugin):
         self.continuous_run = True  # This plugin runs continuously
         self.app = None
         self.is_built_in = built_in
+        self.admin_profiling = False  # /admin/profile samples other processes, so it is opt-in
         super().__init__()
         xlogger.debug("Web Plugin initialized.")
 
@@ -26,7 +35,14 @@ class WebPlugin(Plugin):
         return Template(template_content)
 
 
-    def run(self, host="0.0.0.0", port=8080):
+    def configure(self, admin_profiling: bool = None, **kwargs):
+        """Apply plugin params from config.yaml or a startup file."""
+        if admin_profiling is not None:
+            self.admin_profiling = bool(admin_profiling)
+
+
+    def run(self, host="0.0.0.0", port=8080, **params):
+        self.configure(**params)
         xlogger.debug("Web Plugin is running.")
         xlogger.debug(f"Web Plugin will serve on port {port}")
         
@@ -61,8 +77,48 @@ class WebPlugin(Plugin):
             xlogger.error("Flask not installed. Install with: pip install flask")
             return
             
+        self.create_app()
+
+        xlogger.debug(f"Starting web server on port {port}")
+        
+        # Run the Flask app with graceful shutdown support
+        try:
+            self.app.run(port=port, host=host, debug=False, use_reloader=False, threaded=True)
+        except OSError as e:
+            if "Address already in use" in str(e):
+                xlogger.error(f"Port {port} is already in use. Web server not started.")
+            else:
+                raise
+
+    def create_app(self) -> Flask:
+        """Build the Flask app with all routes, without starting a server."""
         self.app = Flask(__name__)
 
+        @self.app.before_request
+        def start_timer():
+            request.environ["xsoc.start_time"] = time.perf_counter()
+            _http_in_flight.inc()
+
+        @self.app.teardown_request
+        def record_request(exc=None):
+            start = request.environ.pop("xsoc.start_time", None)
+            if start is None:
+                return
+            _http_in_flight.dec()
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            _http_request_seconds.observe(time.perf_counter() - start, method=request.method, route=route)
+
+        @self.app.after_request
+        def count_request(response):
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            _http_requests.inc(method=request.method, route=route, status=response.status_code)
+            return response
+
+        @self.app.route('/metrics')
+        def metrics():
+            # Prometheus text exposition, merged across all plugin processes
+            return xmetrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
         @self.app.route('/')
         def home():
             # Redirect to default xsoc home endpoint
@@ -131,6 +187,77 @@ class WebPlugin(Plugin):
                 template = self.get_template("xsoc-home.html")
             return template.render(xsoc_base_template=xsoc_base_template)
 
+        @self.app.route('/traces')
+        def traces():
+            trace_list = sorted(
+                xtracer.traces(limit=int(request.args.get('limit', 500))).items(),
+                key=lambda item: min(span["start_time"] for span in item[1]),
+                reverse=True,
+            )
+            try:
+                xsoc_base_template = self.get_template("xsoc-base.html")
+            except FileNotFoundError:
+                xsoc_base_template = None
+            template = self.get_template("xsoc-traces.html")
+            return template.render(xsoc_base_template=xsoc_base_template, endpoint='traces', trace_list=trace_list)
+
+        @self.app.route('/api/traces')
+        def traces_api():
+            return {"traces": xtracer.traces(limit=int(request.args.get('limit', 500)))}
+
+        @self.app.route('/api/traces/<trace_id>')
+        def trace_api(trace_id):
+            spans = xtracer.traces(limit=int(request.args.get('limit', 5000))).get(trace_id)
+            if not spans:
+                return {"error": f"Trace {trace_id} not found"}, 404
+            return {"trace_id": trace_id, "spans": spans}
+
+        @self.app.route('/api/history/runs')
+        def history_runs():
+            history = self.plugin_manager.get_history_store() if hasattr(self, 'plugin_manager') else None
+            if not history:
+                return {"error": "Database plugin not available"}, 503
+            since = request.args.get('since', type=float)
+            until = request.args.get('until', type=float)
+            runs = history.get_runs(
+                workflow=request.args.get('workflow'),
+                status=request.args.get('status'),
+                since=since,
+                until=until,
+                limit=request.args.get('limit', 100, type=int),
+            )
+            return {"runs": runs}
+
+        @self.app.route('/api/history/runs/<run_id>')
+        def history_run_steps(run_id):
+            history = self.plugin_manager.get_history_store() if hasattr(self, 'plugin_manager') else None
+            if not history:
+                return {"error": "Database plugin not available"}, 503
+            return {"run_id": run_id, "steps": history.get_run_steps(run_id)}
+
+        @self.app.route('/api/history/cron')
+        def history_cron():
+            history = self.plugin_manager.get_history_store() if hasattr(self, 'plugin_manager') else None
+            if not history:
+                return {"error": "Database plugin not available"}, 503
+            return {"executions": history.get_cron_executions(request.args.get('job'), request.args.get('limit', 100, type=int))}
+
+        @self.app.route('/admin/profile', methods=['POST'])
+        def profile():
+            # Sample stacks of a running plugin process and return collapsed stacks for flamegraph tools
+            if not self.admin_profiling:
+                return {"error": "Profiling is disabled, set admin_profiling: true in the web plugin params"}, 403
+            plugin_name = request.values.get('plugin', 'self')
+            seconds = min(float(request.values.get('seconds', 5)), 120.0)
+            try:
+                output = xprofiler.profile(plugin_name, seconds)
+            except ValueError as e:
+                return {"error": str(e), "processes": xprofiler.processes()}, 404
+            return output, 200, {
+                "Content-Type": "text/plain; charset=utf-8",
+                "Content-Disposition": f"attachment; filename={plugin_name}.collapsed",
+            }
+
         @self.app.route('/page/<page_name>')
         def serve_page_route(page_name):
             return self.serve_page(page_name)
@@ -150,14 +277,5 @@ class WebPlugin(Plugin):
             else:
                 return {"status": "Workflow endpoint", "workflow_id": workflow_id, "workflow": workflow}
 
-        xlogger.debug(f"Starting web server on port {port}")
-        
-        # Run the Flask app with graceful shutdown support
-        try:
-            self.app.run(port=port, host=host, debug=False, use_reloader=False, threaded=True)
-        except OSError as e:
-            if "Address already in use" in str(e):
-                xlogger.error(f"Port {port} is already in use. Web server not started.")
-            else:
-                raise
+        return self.app
 
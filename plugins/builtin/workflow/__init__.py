@@ -1,10 +1,25 @@
 import os
+import time
+import uuid
 from xplugin.plugin import Plugin
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from xplugin.tracing import xtracer
+from xplugin.limits import xlimits
+from plugins.builtin.workflow.context import StepResults, last_references
+from plugins.builtin.workflow.definitions import WorkflowDefinitions
+from plugins.builtin.workflow.policies import RetryPolicy, call_with_timeout, get_breaker
 import jinja2
 
 xlogger.debug("Workflow Plugin initialized.")
 
+_workflow_runs = xmetrics.counter("xsoc_workflow_runs_total", "Workflow runs by outcome", ("workflow", "status"))
+_workflow_run_seconds = xmetrics.histogram("xsoc_workflow_run_seconds", "Workflow run duration", ("workflow",))
+_workflow_step_seconds = xmetrics.histogram("xsoc_workflow_step_seconds", "Workflow step duration", ("workflow", "step", "action", "target"))
+_workflow_step_errors = xmetrics.counter("xsoc_workflow_step_errors_total", "Workflow steps that raised", ("workflow", "step", "action", "target"))
+_workflow_step_retries = xmetrics.counter("xsoc_workflow_step_retries_total", "Workflow step attempts repeated after a failure", ("workflow", "step", "target"))
+_workflows_running = xmetrics.gauge("xsoc_workflows_running", "Workflow runs currently in progress", ("workflow",))
+
 def parse_workflow_config(config_path: str):
     """Parse a workflow from a YAML configuration file."""
     import yaml
@@ -19,27 +34,43 @@ class WorkflowPlugin(Plugin):
     _workflow = None  # Placeholder for workflow object
     separate_process = True
     singleton = False
-    workflows = {}
+    memory_budget_mb = 256  # step results a run may hold in memory before spilling the largest
+    spill_threshold_mb = 16  # results larger than this are always spilled
+    spill_path = None  # defaults to the system temp dir
+    circuit_breaker = None  # e.g. {"failure_threshold": 5, "reset_timeout": 30} for every plugin and tool target
 
     def __init__(self, built_in: bool = False):
         super().__init__()
         self.description = "A plugin to manage workflows"
         self.built_in = built_in
+        # Per instance: a (re)started plugin loads the workflow files again, so removed ones are gone
+        self.workflows = WorkflowDefinitions()
         __import__(f"{__name__}.tools")
 
 
+    def configure(self, memory_budget_mb: float = None, spill_threshold_mb: float = None, spill_path: str = None,
+                  circuit_breaker: dict = None, **kwargs):
+        """Apply plugin params from config.yaml; ``workflow_path`` is read by load_config."""
+        self.memory_budget_mb = memory_budget_mb or self.memory_budget_mb
+        self.spill_threshold_mb = spill_threshold_mb or self.spill_threshold_mb
+        self.spill_path = spill_path or self.spill_path
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else self.circuit_breaker
+
+
     def load_config(self, config):
         for workflow_config_path in os.listdir(config.get('workflow_path', '')):
             xlogger.debug(f"Loading workflow config: {workflow_config_path}")
+            # Hand over the name only; the process reads the shared definition
             yield self, {
-                'workflow': self.create_workflow(os.path.join(config.get('workflow_path', ''), workflow_config_path))
+                'workflow': self.create_workflow(os.path.join(config.get('workflow_path', ''), workflow_config_path))['name']
             }
         
 
     def run(self, **kwargs):
         # self.workflow_config_path = workflow_config_path
-        xlogger.debug(f"Workflow Plugin initialized with config path: {kwargs.get('workflow', {}).get('config_path')}")
         xlogger.debug("Running Workflow Plugin")
+        if isinstance(kwargs.get('workflow'), str):
+            kwargs['workflow'] = self.get_workflow(kwargs['workflow'])
         if kwargs.get('workflow') and kwargs.get('workflow').get('enabled', True):
             xlogger.debug(f"Running workflow: {kwargs['workflow']['name']}")
             return self.run_workflow(kwargs['workflow'])
@@ -47,7 +78,7 @@ class WorkflowPlugin(Plugin):
     
 
     def get_workflow(self, name: str):
-        """Retrieve a workflow by name."""
+        """Retrieve a private copy of a workflow by name."""
         return self.workflows.get(name, None)
     
 
@@ -56,51 +87,187 @@ class WorkflowPlugin(Plugin):
         workflow = parse_workflow_config(config_path)
         xlogger.debug(f"Workflow created from {config_path}: {workflow}")
         xlogger.debug(f"Registering workflow: {workflow['name']}")
-        self.workflows[workflow['name']] = workflow
+        self.workflows.add(workflow)
         return workflow
     
+    def _history_store(self):
+        """Return the database plugin when it is loaded, otherwise None."""
+        plugin_manager = getattr(self, 'plugin_manager', None)
+        return plugin_manager.get_history_store() if plugin_manager else None
+
     def run_workflow(self, workflow):
-        """Run a workflow."""
+        """Run a workflow, given as a definition or the name of a registered one."""
+        if isinstance(workflow, str):
+            name, workflow = workflow, self.get_workflow(workflow)
+            if workflow is None:
+                raise ValueError(f"Workflow {name} not found")
         xlogger.debug(f"Running workflow: {workflow}")
+        workflow_name = workflow.get('name', '')
+        run_id = uuid.uuid4().hex
+        history = self._history_store()
+        status = "error"
+        error = None
+        trace_id = None
+        started_at = time.time()
+        start = time.perf_counter()
+        _workflows_running.inc(workflow=workflow_name)
+        try:
+            with xtracer.span("workflow.run", workflow=workflow_name, run_id=run_id) as span:
+                trace_id = span.trace_id
+                if history:
+                    history.record_workflow_run(run_id, workflow_name, "running", started_at, trace_id=trace_id)
+                result = self._run_steps(workflow, run_id, history)
+            status = "ok"
+            return result
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _workflows_running.dec(workflow=workflow_name)
+            _workflow_runs.inc(workflow=workflow_name, status=status)
+            _workflow_run_seconds.observe(duration, workflow=workflow_name)
+            if history:
+                history.record_workflow_run(run_id, workflow_name, status, started_at, started_at + duration,
+                                            trace_id=trace_id, error=error)
+
+    def _run_steps(self, workflow, run_id=None, history=None):
+        result = None
+        steps = workflow.get('steps', [])
+        results = StepResults(
+            memory_budget=int(float(workflow.get('memory_budget_mb', self.memory_budget_mb)) * 1024 * 1024),
+            spill_threshold=int(float(workflow.get('spill_threshold_mb', self.spill_threshold_mb)) * 1024 * 1024),
+            spill_path=self.spill_path,
+            workflow=workflow.get('name', ''),
+        )
+        # Results no later step reads are dropped as soon as possible
+        references = last_references(steps)
         context = {
             "env": workflow.get('env', {}),
-            "steps": {}
+            "steps": results.view()
+        }
+        try:
+            for index, step in enumerate(steps):
+                result = self._run_step_recorded(workflow, step, context, results, run_id, history)
+                if references is not None:
+                    results.free_unreferenced(references, index)
+                xlogger.debug(context)
+        finally:
+            results.close()
+        self.continuous_run = False
+        return result
+
+    def _run_step_recorded(self, workflow, step, context, results, run_id=None, history=None):
+        result = None
+        xlogger.debug(f"Executing step: {step}")
+        labels = {
+            "workflow": workflow.get('name', ''),
+            "step": step.get('name', ''),
+            "action": step.get('action', ''),
+            "target": step.get('target', ''),
         }
-        for step in workflow.get('steps', []):
-            xlogger.debug(f"Executing step: {step}")
-            # Here you would add logic to execute each step
-            parameters = step.get('parameters', {})
-            xlogger.debug(f"Original parameters: {parameters}")
-            if isinstance(parameters, dict):
-                for key, value in parameters.items():
-                    parameters[key] = jinja2.Template(str(value)).render(context)
-            if isinstance(parameters, list):
-                for i in range(len(parameters)):
-                    parameters[i] = jinja2.Template(str(parameters[i])).render(context)
-            xlogger.debug(f"Resolved parameters: {parameters}")
-            match step.get('action'):
-                case 'tool':
-                    tool_name = step.get('target')
-                    xlogger.debug(f"Running tool {tool_name} with parameters {parameters}")
-                    # Placeholder for actual tool execution
-                    # Dynamic call 
+        step_started_at = time.time()
+        step_start = time.perf_counter()
+        status = "ok"
+        error = None
+        try:
+            with xtracer.span("workflow.step", **labels):
+                try:
+                    result = self._run_step_with_policies(step, context, labels)
+                except Exception as e:
+                    error = repr(e)
+                    _workflow_step_errors.inc(**labels)
+                    result, status = self._on_step_error(step, context, e)
+            results.store(step['name'], result)
+        except Exception as e:
+            status = "error"
+            error = error if error else repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - step_start
+            _workflow_step_seconds.observe(duration, **labels)
+            if history:
+                # A spilled result is recorded by its handle rather than formatted in full
+                history.record_step_result(run_id, labels["workflow"], labels["step"], labels["action"], labels["target"],
+                                           status, step_started_at, duration,
+                                           result=None if status == "error" else results.raw(step['name']), error=error)
+        return result
+
+    def _run_step_with_policies(self, step, context, labels=None):
+        """Run a step under its ``timeout``, ``retry`` and circuit breaker policies."""
+        if step.get('action') not in ('tool', 'plugin'):
+            return self._run_step(step, context)
+        retry = RetryPolicy.from_config(step.get('retry'))
+        breaker_config = step.get('circuit_breaker', self.circuit_breaker)
+        breaker = get_breaker(step.get('target'), breaker_config) if breaker_config else None
+        attempt = 1
+        while True:
+            if breaker:
+                breaker.before_call()
+            try:
+                result = call_with_timeout(self._run_step, step.get('timeout'), step, context, target=step.get('target'))
+            except Exception as e:
+                if breaker:
+                    breaker.record_failure()
+                if attempt >= retry.max_attempts:
+                    raise
+                delay = retry.delay(attempt)
+                xlogger.warning(f"Step {step.get('name')} failed on attempt {attempt}/{retry.max_attempts}, retrying in {delay:.2f}s: {e!r}")
+                _workflow_step_retries.inc(workflow=(labels or {}).get('workflow', ''), step=step.get('name', ''), target=step.get('target', ''))
+                # Back off on the shutdown event, so stopping the plugin ends the wait at once
+                if self.wait_or_shutdown(timeout=delay):
+                    raise
+                attempt += 1
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+
+    def _on_step_error(self, step, context, error):
+        """Apply a failed step's ``on_error``: ``fail`` (default), ``continue`` or ``fallback``."""
+        on_error = step.get('on_error', 'fail')
+        if on_error == 'continue':
+            xlogger.warning(f"Step {step.get('name')} failed, continuing: {error!r}")
+            return None, "continued"
+        if on_error == 'fallback' and step.get('fallback'):
+            xlogger.warning(f"Step {step.get('name')} failed, running its fallback: {error!r}")
+            fallback = {'name': f"{step.get('name')}.fallback", **step['fallback']}
+            return self._run_step_with_policies(fallback, context), "fallback"
+        raise error
+
+    def _run_step(self, step, context):
+        result = None
+        # Here you would add logic to execute each step
+        parameters = step.get('parameters', {})
+        xlogger.debug(f"Original parameters: {parameters}")
+        # Rendered into new containers, so a retried step renders its templates again
+        if isinstance(parameters, dict):
+            parameters = {key: jinja2.Template(str(value)).render(context) for key, value in parameters.items()}
+        if isinstance(parameters, list):
+            parameters = [jinja2.Template(str(value)).render(context) for value in parameters]
+        xlogger.debug(f"Resolved parameters: {parameters}")
+        match step.get('action'):
+            case 'tool':
+                tool_name = step.get('target')
+                xlogger.debug(f"Running tool {tool_name} with parameters {parameters}")
+                # Placeholder for actual tool execution
+                # Dynamic call 
+                with xlimits.limit("tools", tool_name), xtracer.span(f"tool.{tool_name}"):
                     result = globals()['tools'].__dict__[tool_name](parameters)
-                    xlogger.debug(f"Tool {tool_name} result: {result}")
-                case 'wait':
-                    duration = step.get('duration', 1)
-                    # xlogger.debug(f"Waiting for {duration} seconds")
-                    self.wait_or_shutdown(timeout=duration)
-                case 'plugin':
-                    plugin_name, tool_name = step.get('target').split('.')
-                    # Dynamic call
-                    if self.plugin_manager and self.plugin_manager.get_plugin(plugin_name):
-                        plugin_instance = self.plugin_manager.get_plugin(plugin_name)
-                    else:
-                        xlogger.error(f"Plugin {plugin_name} not found")
-                        raise ValueError(f"Plugin {plugin_name} not found")
+                xlogger.debug(f"Tool {tool_name} result: {result}")
+            case 'wait':
+                duration = step.get('duration', 1)
+                # xlogger.debug(f"Waiting for {duration} seconds")
+                self.wait_or_shutdown(timeout=duration)
+            case 'plugin':
+                plugin_name, tool_name = step.get('target').split('.')
+                # Dynamic call
+                if self.plugin_manager and self.plugin_manager.get_plugin(plugin_name):
+                    plugin_instance = self.plugin_manager.get_plugin(plugin_name)
+                else:
+                    xlogger.error(f"Plugin {plugin_name} not found")
+                    raise ValueError(f"Plugin {plugin_name} not found")
+                with xlimits.limit(plugin_name, tool_name), xtracer.span(step.get('target'), plugin=plugin_name, method=tool_name):
                     result = getattr(plugin_instance, tool_name)(**parameters)
-                    # xlogger.debug(f"Plugin {plugin_name} result: {result}")
-            context['steps'][step['name']] = result
-            xlogger.debug(context)
-        self.continuous_run = False
+                # xlogger.debug(f"Plugin {plugin_name} result: {result}")
         return result
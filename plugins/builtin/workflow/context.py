@@ -0,0 +1,239 @@
+from collections.abc import Mapping
+import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+
+from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+
+
+_spilled_bytes = xmetrics.counter("xsoc_workflow_spilled_bytes_total", "Step result bytes written to the spill area", ("workflow",))
+_freed_results = xmetrics.counter("xsoc_workflow_results_freed_total", "Step results released after their last reference", ("workflow",))
+
+_TEMPLATE_BLOCK = re.compile(r"\{\{.*?\}\}|\{%.*?%\}", re.DOTALL)
+_STEPS_NAME = re.compile(r"\bsteps\b")
+_STEP_REFERENCE = re.compile(r"""\bsteps\s*(?:\.\s*(\w+)|\[\s*['"]([^'"]+)['"]\s*\])""")
+_MAPPING_CALL = re.compile(r"\bsteps\s*\.\s*(?:get|keys|items|values)\s*\(")
+
+
+def estimate_size(value, limit: int) -> int:
+    """Approximate memory held by ``value``, counting at most until ``limit`` is exceeded."""
+    total = 0
+    stack = [value]
+    seen = set()
+    while stack and total <= limit:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+
+
+def last_references(steps: list):
+    """Map each step name to the index of the last step whose templates read its result.
+
+    Returns None when a template uses ``steps`` in a way that cannot be
+    resolved statically, e.g. ``steps[name]`` or ``steps.get('a')``, in which
+    case nothing may be freed early.
+    """
+    last = {}
+    for index, step in enumerate(steps):
+        fields = {key: value for key, value in step.items() if key != 'name'}
+        for text in _strings(fields):
+            for block in _TEMPLATE_BLOCK.findall(text):
+                if _MAPPING_CALL.search(block):
+                    return None
+                references = _STEP_REFERENCE.findall(block)
+                if len(references) != len(_STEPS_NAME.findall(block)):
+                    return None
+                for attribute, item in references:
+                    last[attribute or item] = index
+    return last
+
+
+class SpilledResult:
+    """Handle to a step result written to the run's spill directory."""
+
+    __slots__ = ("path", "size")
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    def load(self):
+        with open(self.path, "rb") as file:
+            return pickle.load(file)
+
+    def __repr__(self):
+        return f"<spilled result, {self.size} bytes>"
+
+
+class StepsView(Mapping):
+    """Read-only view of a run's results, handed to templates as ``steps``.
+
+    Jinja looks up ``steps.name`` as an attribute first, so the view has no
+    public attributes of its own, and a step result takes precedence over the
+    mapping methods (``get``, ``keys``, ``items``, ``values``) of the same name.
+    """
+
+    __slots__ = ("_results",)
+
+    def __init__(self, results: "StepResults"):
+        self._results = results
+
+    def __getattribute__(self, name):
+        if not name.startswith("_"):
+            results = object.__getattribute__(self, "_results")
+            if name in results:
+                return results[name]
+        return object.__getattribute__(self, name)
+
+    def __getitem__(self, name):
+        return self._results[name]
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, name):
+        return name in self._results
+
+    def __repr__(self):
+        return repr(self._results)
+
+
+class StepResults(Mapping):
+    """Results of the steps of one run. Templates read them through ``view()``.
+
+    Results larger than ``spill_threshold`` bytes, and the largest results
+    once the run holds more than ``memory_budget`` bytes, are pickled to a
+    temporary directory. Reading them through the mapping loads them again,
+    so a template only pays for what it uses.
+    """
+
+    def __init__(self, memory_budget: int, spill_threshold: int, spill_path: str = None, workflow: str = ""):
+        self.memory_budget = memory_budget
+        self.spill_threshold = spill_threshold
+        self.spill_path = spill_path
+        self.workflow = workflow
+        self.in_memory = 0
+        self._values = {}
+        self._sizes = {}
+        self._spill_dir = None
+        self._spilled = 0
+
+    def __getitem__(self, name):
+        value = self._values[name]
+        return value.load() if isinstance(value, SpilledResult) else value
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, name):
+        # Membership must not load a spilled result
+        return name in self._values
+
+    def __repr__(self):
+        return "{" + ", ".join(f"{name!r}: {self._preview(name)}" for name in self._values) + "}"
+
+    def _preview(self, name: str, width: int = 200) -> str:
+        # Never format a large result just to log it
+        value = self._values[name]
+        if not isinstance(value, SpilledResult) and self._sizes.get(name, 0) > 16 * width:
+            return f"<{type(value).__name__}, ~{self._sizes[name]} bytes>"
+        text = repr(value)
+        return text if len(text) <= width else text[:width] + "..."
+
+    def view(self) -> StepsView:
+        return StepsView(self)
+
+    def raw(self, name):
+        """The stored value, or its SpilledResult handle, without loading it."""
+        return self._values.get(name)
+
+    def store(self, name: str, value):
+        self.discard(name)
+        self._values[name] = value
+        size = estimate_size(value, max(self.memory_budget, self.spill_threshold))
+        if size > self.spill_threshold and self._spill(name):
+            return
+        self._sizes[name] = size
+        self.in_memory += size
+        while self.in_memory > self.memory_budget and self._sizes:
+            largest = max(self._sizes, key=self._sizes.get)
+            if not self._spill(largest):
+                break
+
+    def _spill(self, name: str) -> bool:
+        if self._spill_dir is None:
+            if self.spill_path:
+                os.makedirs(self.spill_path, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="xsoc-run-", dir=self.spill_path)
+        self._spilled += 1
+        path = os.path.join(self._spill_dir, f"{self._spilled}.pickle")
+        try:
+            # Pickle straight into the file; large buffers are written without an in-memory copy
+            with open(path, "wb") as file:
+                pickle.dump(self._values[name], file, protocol=pickle.HIGHEST_PROTOCOL)
+                size = file.tell()
+        except Exception as e:
+            xlogger.debug(f"Step result {name} cannot be spilled, keeping it in memory: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return False
+        self._values[name] = SpilledResult(path, size)
+        self.in_memory -= self._sizes.pop(name, 0)
+        _spilled_bytes.inc(size, workflow=self.workflow)
+        xlogger.debug(f"Spilled step result {name} ({size} bytes) to {path}")
+        return True
+
+    def discard(self, name: str):
+        """Release a result that no later step reads."""
+        value = self._values.pop(name, None)
+        self.in_memory -= self._sizes.pop(name, 0)
+        if isinstance(value, SpilledResult):
+            try:
+                os.remove(value.path)
+            except OSError:
+                pass
+
+    def free_unreferenced(self, references: dict, index: int):
+        """Drop results whose last reference is at or before step ``index``."""
+        for name in [name for name in self._values if references.get(name, -1) <= index]:
+            self.discard(name)
+            _freed_results.inc(workflow=self.workflow)
+
+    def close(self):
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._values.clear()
+        self._sizes.clear()
+        self.in_memory = 0
@@ -0,0 +1,37 @@
+import pickle
+
+
+class WorkflowDefinitions:
+    """Registered workflows, each kept as one immutable pickled buffer.
+
+    A forked process shares these buffers with its parent page for page,
+    whereas nested dicts are copied as soon as their reference counts are
+    touched. ``get`` returns a private copy, so a run can never change the
+    definition seen by the next run.
+    """
+
+    def __init__(self):
+        self._definitions = {}
+
+    def add(self, workflow: dict):
+        self._definitions[workflow['name']] = pickle.dumps(workflow, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, name: str, default=None):
+        data = self._definitions.get(name)
+        return pickle.loads(data) if data is not None else default
+
+    def remove(self, name: str):
+        self._definitions.pop(name, None)
+
+    def names(self) -> list:
+        return list(self._definitions)
+
+    def size(self) -> int:
+        """Bytes held by all definitions."""
+        return sum(len(data) for data in self._definitions.values())
+
+    def __contains__(self, name) -> bool:
+        return name in self._definitions
+
+    def __len__(self) -> int:
+        return len(self._definitions)
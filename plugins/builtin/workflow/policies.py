@@ -0,0 +1,169 @@
+import contextvars
+import random
+import threading
+import time
+
+from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+
+
+_circuit_open = xmetrics.gauge("xsoc_workflow_circuit_open", "Whether the circuit breaker of a step target is open", ("target",))
+_abandoned_calls = xmetrics.gauge("xsoc_workflow_abandoned_calls", "Timed-out step calls still running in the background", ("target",))
+
+
+class StepTimeout(Exception):
+    """Raised when a step runs longer than its ``timeout``."""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a target whose circuit breaker is open."""
+
+
+class RetryPolicy:
+    """How often a failed step is attempted again and how long to back off in between.
+
+    The delay before attempt ``n + 1`` is ``backoff * multiplier ** (n - 1)``,
+    capped at ``max_backoff``, with up to half of it taken off at random when
+    ``jitter`` is set so that runs failing together do not retry together.
+    """
+
+    def __init__(self, max_attempts: int = 1, backoff: float = 1.0, max_backoff: float = 30.0,
+                 multiplier: float = 2.0, jitter: bool = True):
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.multiplier = float(multiplier)
+        self.jitter = jitter
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a policy from a step's ``retry``, either a number of attempts or a mapping."""
+        if not config:
+            return cls()
+        if isinstance(config, dict):
+            return cls(**config)
+        return cls(max_attempts=config)
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        return random.uniform(delay / 2, delay) if self.jitter else delay
+
+
+class CircuitBreaker:
+    """Fail fast on a target after ``failure_threshold`` consecutive failures.
+
+    Once open, calls raise CircuitOpen for ``reset_timeout`` seconds. After
+    that a single trial call is let through; its outcome closes the circuit
+    again or keeps it open for another ``reset_timeout``.
+    """
+
+    def __init__(self, target: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.target = target
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return
+            raise CircuitOpen(f"Circuit for {self.target} is open after {self.failures} consecutive failures")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                xlogger.info(f"Circuit for {self.target} closed")
+                _circuit_open.set(0, target=self.target)
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    xlogger.warning(f"Circuit for {self.target} opened after {self.failures} consecutive failures")
+                    _circuit_open.set(1, target=self.target)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(target: str, config: dict) -> CircuitBreaker:
+    """The breaker of ``target`` in this process, replaced when its settings change."""
+    settings = (int(config.get("failure_threshold", 5)), float(config.get("reset_timeout", 30.0)))
+    breaker = _breakers.get(target)
+    if breaker is None or (breaker.failure_threshold, breaker.reset_timeout) != settings:
+        with _breakers_lock:
+            breaker = _breakers.get(target)
+            if breaker is None or (breaker.failure_threshold, breaker.reset_timeout) != settings:
+                breaker = _breakers[target] = CircuitBreaker(target, *settings)
+    return breaker
+
+
+_abandoned = {}  # target -> timed-out calls still running on their thread
+_abandoned_lock = threading.Lock()
+
+
+def abandoned_calls(target: str) -> int:
+    return _abandoned.get(target, 0)
+
+
+def call_with_timeout(func, timeout, *args, target: str = None, **kwargs):
+    """Call ``func``, raising StepTimeout if it does not return within ``timeout`` seconds.
+
+    A timed call runs on a daemon thread. Threads cannot be interrupted, so
+    a call that timed out keeps running in the background, still holding
+    whatever it acquired, including its rate-limit slot. While such a call
+    to ``target`` is running, later calls to it fail at once with
+    StepTimeout instead of piling up more threads behind it.
+    """
+    if target is not None and _abandoned.get(target):
+        raise StepTimeout(f"An earlier call to {target} timed out and is still running")
+    if not timeout:
+        return func(*args, **kwargs)
+    done = threading.Event()
+    outcome = {}
+    # Keep the current trace span as the parent of spans opened by the call
+    context = contextvars.copy_context()
+
+    def call():
+        try:
+            outcome["result"] = context.run(func, *args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            with _abandoned_lock:
+                done.set()
+                if outcome.get("abandoned"):
+                    _abandoned[target] -= 1
+                    _abandoned_calls.set(_abandoned[target], target=target)
+                    if not _abandoned[target]:
+                        del _abandoned[target]
+
+    threading.Thread(target=call, name="xsoc-step", daemon=True).start()
+    if not done.wait(float(timeout)):
+        with _abandoned_lock:
+            if not done.is_set():
+                if target is not None:
+                    outcome["abandoned"] = True
+                    _abandoned[target] = _abandoned.get(target, 0) + 1
+                    _abandoned_calls.set(_abandoned[target], target=target)
+                raise StepTimeout(f"Step did not finish within {timeout}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
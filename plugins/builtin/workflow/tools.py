@@ -37,14 +37,25 @@ def concatenate_strings(args) -> str:
     return ''.join(str(arg) for arg in args)
 
 
-def loop_until_condition_met(condition: callable, timeout: int = 10) -> bool:
-    """Loop until the condition is met or timeout occurs."""
+def loop_until_condition_met(condition: callable, timeout: int = 10, interval: float = 1.0, event=None) -> bool:
+    """Loop until the condition is met or timeout occurs.
+
+    The condition is checked again after 10ms, doubling up to ``interval``, and
+    never past the timeout. Passing ``event`` (e.g. a plugin's shutdown event)
+    ends the wait as soon as it is set.
+    """
+    import threading
     import time
-    start_time = time.time()
+    event = event or threading.Event()
+    deadline = time.monotonic() + timeout
+    delay = 0.01
     while not condition():
-        if time.time() - start_time > timeout:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
             return False
-        time.sleep(0.1)  # Sleep to avoid busy waiting
+        if event.wait(min(delay, remaining)):
+            return bool(condition())
+        delay = min(delay * 2, interval)
     return True
 
 
@@ -0,0 +1,269 @@
+import os
+import signal
+import threading
+
+from xplugin.logger import xlogger
+
+
+class ConfigError(Exception):
+    """Raised when a configuration file cannot be read or does not match its schema."""
+
+
+_LIMIT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rate": {"type": "number"},
+        "burst": {"type": "number"},
+        "max_concurrency": {"type": "integer"},
+        "queue_timeout": {"type": "number"},
+    },
+}
+
+_PLUGIN_SCHEMA = {
+    "type": ["object", "null"],
+    "properties": {
+        "enabled": {"type": "boolean"},
+        "builtin": {"type": "boolean"},
+        "startup": {"type": "boolean"},
+        "dependencies": {"type": "array", "items": {"type": "string"}},
+        "params": {"type": ["object", "null"]},
+        "limits": {
+            "type": "object",
+            "properties": {
+                **_LIMIT_SCHEMA["properties"],
+                "methods": {"type": "object", "additionalProperties": _LIMIT_SCHEMA},
+            },
+        },
+    },
+}
+
+SCHEMAS = {
+    "config": {
+        "type": "object",
+        "properties": {
+            "debug": {"type": "boolean"},
+            "startup_path": {"type": "string"},
+            "reload": {
+                "type": "object",
+                "properties": {
+                    "watch": {"type": "boolean"},
+                    "interval": {"type": "number"},
+                },
+            },
+            "metrics": {"type": "object"},
+            "tracing": {"type": "object"},
+            "limits": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "poll_interval": {"type": "number"},
+                    "targets": {"type": "object", "additionalProperties": _LIMIT_SCHEMA},
+                },
+            },
+            "plugins": {"type": ["object", "null"], "additionalProperties": _PLUGIN_SCHEMA},
+        },
+    },
+    "startup": {
+        "type": "object",
+        "properties": {
+            "startups": {
+                "type": ["array", "null"],
+                "items": {
+                    "type": "object",
+                    "additionalProperties": {
+                        "type": "object",
+                        "required": ["plugin"],
+                        "properties": {
+                            "plugin": {"type": "string"},
+                            "context": {"type": ["object", "null"]},
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "number": (int, float),
+    "integer": int,
+    "null": type(None),
+}
+
+_compiled = {}
+
+
+def _compile(schema: dict):
+    """Turn a schema into a validator function that appends errors to a list."""
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    expected = tuple(_TYPES[name] for name in types) if types else None
+    properties = {key: _compile(sub) for key, sub in schema.get("properties", {}).items()}
+    extra = _compile(schema["additionalProperties"]) if isinstance(schema.get("additionalProperties"), dict) else None
+    items = _compile(schema["items"]) if "items" in schema else None
+    required = schema.get("required", [])
+
+    def validate(value, path, errors):
+        if expected is not None:
+            # bool is a subclass of int, so it must not satisfy "number"
+            if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+                errors.append(f"{path or '<root>'}: expected {' or '.join(types)}, got {type(value).__name__}")
+                return
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path}.{key}: required")
+            for key, item in value.items():
+                if key in properties:
+                    properties[key](item, f"{path}.{key}" if path else key, errors)
+                elif extra is not None:
+                    extra(item, f"{path}.{key}" if path else key, errors)
+        elif isinstance(value, list) and items is not None:
+            for index, item in enumerate(value):
+                items(item, f"{path}[{index}]", errors)
+
+    return validate
+
+
+def validate(data, schema_name: str):
+    """Validate ``data`` against a named schema, compiling it on first use."""
+    validator = _compiled.get(schema_name)
+    if validator is None:
+        validator = _compiled[schema_name] = _compile(SCHEMAS[schema_name])
+    errors = []
+    validator(data, "", errors)
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return data
+
+
+_file_cache = {}
+
+
+def load_yaml(path: str, schema_name: str) -> dict:
+    """Load and validate a YAML file, reusing the last result while the file is unchanged."""
+    import yaml
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ConfigError(f"Cannot read {path}: {e}")
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_cache.get((path, schema_name))
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        with open(path, 'r') as file:
+            data = yaml.safe_load(file) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigError(f"Cannot parse {path}: {e}")
+    validate(data, schema_name)
+    _file_cache[(path, schema_name)] = (signature, data)
+    return data
+
+
+def diff(old, new, path: str = ""):
+    """Structural diff of two parsed configs as a list of (path, kind) with kind added/removed/changed."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old.keys() | new.keys():
+            child = f"{path}.{key}" if path else str(key)
+            if key not in new:
+                changes.append((child, "removed"))
+            elif key not in old:
+                changes.append((child, "added"))
+            else:
+                changes.extend(diff(old[key], new[key], child))
+        return sorted(changes)
+    if old != new:
+        return [(path, "changed")]
+    return []
+
+
+def plugin_specs(config: dict, startup_config: dict = None) -> dict:
+    """Build the desired state of every plugin from config.yaml and the startup file.
+
+    A plugin runs at startup when it is listed in the startup file or has
+    ``startup: true``, in which case its ``params`` become the run context.
+    """
+    specs = {}
+    for name, info in (config.get("plugins") or {}).items():
+        info = info or {}
+        if info.get("enabled", True) is False:
+            xlogger.debug(f"Plugin {name} is disabled in configuration")
+            continue
+        specs[name] = {
+            "name": name,
+            "builtin": info.get("builtin", False),
+            "params": info.get("params") or {},
+            "dependencies": list(info.get("dependencies") or []),
+            "limits": info.get("limits") or {},
+            "startups": [{"name": name, "context": info.get("params") or {}}] if info.get("startup", False) else [],
+        }
+    for startup in (startup_config or {}).get("startups") or []:
+        for startup_name, startup_info in startup.items():
+            plugin_name = startup_info["plugin"]
+            spec = specs.setdefault(plugin_name, {
+                "name": plugin_name,
+                "builtin": False,
+                "params": {},
+                "dependencies": [],
+                "limits": {},
+                "startups": [],
+            })
+            spec["startups"].append({"name": startup_name, "context": startup_info.get("context") or {}})
+    return specs
+
+
+class ConfigWatcher:
+    """Request a reload on SIGHUP or when any watched file changes.
+
+    The watcher only sets ``reload_requested``; the plugin manager's main loop
+    performs the reload so that processes are always started from the main thread.
+    """
+
+    def __init__(self, paths: list, interval: float = 2.0):
+        self.paths = [path for path in paths if path]
+        self.interval = interval
+        self.reload_requested = threading.Event()
+        self._stop = threading.Event()
+        self._signatures = {path: self._signature(path) for path in self.paths}
+        self._thread = None
+
+    def _signature(self, path: str):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_requested.set())
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._poll, name="xsoc-config-watcher", daemon=True)
+            self._thread.start()
+        xlogger.debug(f"Watching {self.paths} for configuration changes")
+
+    def set_paths(self, paths: list):
+        """Watch ``paths`` from now on, e.g. after a reload moved the startup file."""
+        paths = [path for path in paths if path]
+        self._signatures = {path: self._signatures[path] if path in self._signatures else self._signature(path)
+                            for path in paths}
+        self.paths = paths
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature != self._signatures.get(path):
+                    self._signatures[path] = signature
+                    xlogger.info(f"Configuration file {path} changed")
+                    self.reload_requested.set()
+
+    def stop(self):
+        self._stop.set()
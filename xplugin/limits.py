@@ -0,0 +1,339 @@
+from contextlib import ExitStack, contextmanager
+import contextvars
+import fcntl
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import weakref
+
+from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+
+
+_limit_wait_seconds = xmetrics.histogram("xsoc_limit_wait_seconds", "Time spent queued for a target's limits", ("target",))
+_limit_timeouts = xmetrics.counter("xsoc_limit_timeouts_total", "Calls rejected after their queue timeout", ("target",))
+
+LIMIT_KEYS = ("rate", "burst", "max_concurrency", "queue_timeout")
+
+# Shared state of one target: a header, the pids holding a slot and the queued (ticket, pid) pairs
+MAX_SLOTS = 256
+MAX_WAITERS = 1024
+_HEADER = struct.Struct("<ddQII")  # tokens, refilled at, next ticket, holder count, waiter count
+_HOLDER = struct.Struct("<q")
+_WAITER = struct.Struct("<Qq")
+_HOLDERS_OFFSET = _HEADER.size
+_WAITERS_OFFSET = _HOLDERS_OFFSET + MAX_SLOTS * _HOLDER.size
+_STATE_SIZE = _WAITERS_OFFSET + MAX_WAITERS * _WAITER.size
+
+
+# Targets whose limits the current call chain already holds, e.g. a plugin method calling its own run_tool
+_held = contextvars.ContextVar("xsoc_limits_held", default=frozenset())
+
+
+class LimitTimeout(Exception):
+    """Raised when a call waited longer than its target's queue timeout."""
+
+
+def _close(state: mmap.mmap, fd: int):
+    state.close()
+    os.close(fd)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Limiter:
+    """Token bucket and concurrency cap for one target, shared through a small mmap'ed file.
+
+    Every process on the node maps the same file and changes it under an
+    ``fcntl`` lock. Callers queue by ticket and only the oldest live waiter
+    may take a slot, so waiters are served in arrival order across processes.
+    The head waits exactly until its next token; other waiters sleep until a
+    local release or, for releases in other processes, at most ``poll_interval``.
+    """
+
+    def __init__(self, name: str, path: str, rate: float = None, burst: float = None, max_concurrency: int = None,
+                 queue_timeout: float = None, poll_interval: float = 0.05):
+        self.name = name
+        self.rate = float(rate) if rate else None
+        self.burst = float(burst) if burst else max(1.0, self.rate or 1.0)
+        self.max_concurrency = min(int(max_concurrency), MAX_SLOTS) if max_concurrency else None
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _STATE_SIZE:
+            os.ftruncate(self._fd, _STATE_SIZE)
+        self._map = mmap.mmap(self._fd, _STATE_SIZE)
+        # Replaced limiters may still be in use by a caller, so they are closed once unreferenced
+        weakref.finalize(self, _close, self._map, self._fd)
+
+    @contextmanager
+    def _shared(self):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            yield _HEADER.unpack_from(self._map, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _waiters(self, count: int) -> list:
+        return [_WAITER.unpack_from(self._map, _WAITERS_OFFSET + index * _WAITER.size) for index in range(count)]
+
+    def _holders(self, count: int) -> list:
+        return [_HOLDER.unpack_from(self._map, _HOLDERS_OFFSET + index * _HOLDER.size)[0] for index in range(count)]
+
+    def _write(self, tokens, refilled, next_ticket, holders: list, waiters: list):
+        _HEADER.pack_into(self._map, 0, tokens, refilled, next_ticket, len(holders), len(waiters))
+        for index, pid in enumerate(holders):
+            _HOLDER.pack_into(self._map, _HOLDERS_OFFSET + index * _HOLDER.size, pid)
+        for index, (ticket, pid) in enumerate(waiters):
+            _WAITER.pack_into(self._map, _WAITERS_OFFSET + index * _WAITER.size, ticket, pid)
+
+    def _dequeue(self, ticket: int):
+        with self._shared() as (tokens, refilled, next_ticket, holder_count, waiter_count):
+            waiters = [waiter for waiter in self._waiters(waiter_count) if waiter[0] != ticket]
+            self._write(tokens, refilled, next_ticket, self._holders(holder_count), waiters)
+
+    def _try_acquire(self, ticket, pid: int):
+        """Queue up when ``ticket`` is None, then take a slot and a token if it is our turn.
+
+        Returns the ticket and None on success, otherwise the ticket and how long to wait.
+        """
+        with self._shared() as (tokens, refilled, next_ticket, holder_count, waiter_count):
+            now = time.monotonic()
+            if self.rate:
+                tokens = self.burst if refilled == 0 else min(self.burst, tokens + (now - refilled) * self.rate)
+                refilled = now
+            waiters = self._waiters(waiter_count)
+            if ticket is None:
+                if len(waiters) >= MAX_WAITERS:
+                    waiters = [(queued, owner) for queued, owner in waiters if owner == pid or _alive(owner)]
+                    if len(waiters) >= MAX_WAITERS:
+                        raise LimitTimeout(f"Queue for {self.name} is full")
+                ticket = next_ticket
+                next_ticket += 1
+                waiters.append((ticket, pid))
+            # Waiters left behind by a process that died never come back for their turn
+            while waiters:
+                head = min(waiters)
+                if head[1] == pid or _alive(head[1]):
+                    break
+                waiters.remove(head)
+            holders = self._holders(holder_count)
+            if self.max_concurrency and len(holders) >= self.max_concurrency:
+                holders = [owner for owner in holders if owner == pid or _alive(owner)]
+
+            wait = None
+            if waiters and min(waiters)[0] != ticket:
+                wait = self.poll_interval
+            elif self.max_concurrency and len(holders) >= self.max_concurrency:
+                wait = self.poll_interval
+            elif self.rate and tokens < 1:
+                wait = (1 - tokens) / self.rate
+            else:
+                if self.rate:
+                    tokens -= 1
+                if self.max_concurrency:
+                    holders.append(pid)
+                waiters = [waiter for waiter in waiters if waiter[0] != ticket]
+            self._write(tokens, refilled, next_ticket, holders, waiters)
+            return ticket, wait
+
+    def acquire(self, timeout: float = None):
+        """Wait for a slot and a token, raising LimitTimeout after ``timeout`` or the queue timeout."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        pid = os.getpid()
+        ticket = None
+        with self._cond:
+            try:
+                while True:
+                    ticket, wait = self._try_acquire(ticket, pid)
+                    if wait is None:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            _limit_timeouts.inc(target=self.name)
+                            raise LimitTimeout(f"Waited more than {timeout}s for {self.name}")
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                if ticket is not None:
+                    self._dequeue(ticket)
+                raise
+            # The next local waiter may now be at the head of the queue
+            self._cond.notify_all()
+        _limit_wait_seconds.observe(time.monotonic() - start, target=self.name)
+
+    def release(self):
+        if not self.max_concurrency:
+            return
+        pid = os.getpid()
+        with self._cond:
+            with self._shared() as (tokens, refilled, next_ticket, holder_count, waiter_count):
+                holders = self._holders(holder_count)
+                if pid in holders:
+                    holders.remove(pid)
+                    self._write(tokens, refilled, next_ticket, holders, self._waiters(waiter_count))
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LimitRegistry:
+    """Limits of every target, e.g. ``hello_world`` or ``hello_world.say_hello_to``.
+
+    Limits come from a plugin class' ``limits`` attribute, from the plugin's
+    ``limits`` in config.yaml and from the top-level ``limits.targets``, in
+    increasing precedence. The merged table is published as ``limits.json`` in
+    the shared directory so processes forked earlier pick up changes too.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.poll_interval = 0.05
+        self._targets = {}
+        self._declared = {}
+        self._specs = {}
+        self._limiters = {}
+        self._signature = None
+        self._checked = 0.0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, path: str = None, targets: dict = None, poll_interval: float = None):
+        """Set the shared directory and the limits configured per target in config.yaml."""
+        self.path = path or os.getenv("XSOC_LIMITS_DIR") or os.path.join(tempfile.gettempdir(), "xsoc-limits")
+        self.poll_interval = poll_interval or self.poll_interval
+        os.makedirs(self.path, exist_ok=True)
+        self._targets = {target: dict(spec) for target, spec in (targets or {}).items()}
+        self._publish()
+
+    def declare(self, plugin_name: str, limits: dict = None):
+        """Set the limits of a plugin and its methods, e.g. ``{"max_concurrency": 4, "methods": {...}}``."""
+        specs = {}
+        limits = limits or {}
+        if any(key in limits for key in LIMIT_KEYS):
+            specs[plugin_name] = {key: limits[key] for key in LIMIT_KEYS if key in limits}
+        for method, spec in (limits.get("methods") or {}).items():
+            specs[f"{plugin_name}.{method}"] = dict(spec)
+        if specs or plugin_name in self._declared:
+            self._declared[plugin_name] = specs
+            self._publish()
+
+    def _manifest(self) -> str:
+        if self.path is None:
+            self.configure(targets=self._targets)
+        return os.path.join(self.path, "limits.json")
+
+    def _publish(self):
+        specs = {}
+        for declared in self._declared.values():
+            specs.update(declared)
+        specs.update(self._targets)
+        manifest = self._manifest()
+        with self._lock:
+            tmp_path = f"{manifest}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump({"poll_interval": self.poll_interval, "targets": specs}, file)
+            os.replace(tmp_path, manifest)
+            self._apply(specs)
+            self._signature = self._stat(manifest)
+        xlogger.debug(f"Limits published to {manifest}: {specs}")
+
+    def _stat(self, path: str):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+        except OSError:
+            return None
+
+    def _apply(self, specs: dict):
+        for target in list(self._limiters):
+            if self._specs.get(target) != specs.get(target):
+                self._limiters.pop(target)
+        self._specs = specs
+
+    def _refresh(self):
+        if self._pid != os.getpid():
+            # Locks and conditions inherited through fork may be held by threads that did not survive it
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._limiters = {}
+        now = time.monotonic()
+        if self.path is None or now - self._checked < 1.0:
+            return
+        self._checked = now
+        manifest = os.path.join(self.path, "limits.json")
+        signature = self._stat(manifest)
+        if signature == self._signature:
+            return
+        try:
+            with open(manifest, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            xlogger.debug(f"Could not read limits from {manifest}: {e}")
+            return
+        with self._lock:
+            self.poll_interval = data.get("poll_interval", self.poll_interval)
+            self._apply(data.get("targets", {}))
+            self._signature = signature
+
+    def get(self, target: str):
+        """Return the limiter of ``target``, or None when it is not limited."""
+        self._refresh()
+        limiter = self._limiters.get(target)
+        if limiter is None and target in self._specs:
+            with self._lock:
+                limiter = self._limiters.get(target)
+                if limiter is None:
+                    file_name = re.sub(r"[^A-Za-z0-9_.-]", "_", target) + ".lim"
+                    limiter = Limiter(target, os.path.join(self.path, file_name), poll_interval=self.poll_interval,
+                                      **{key: value for key, value in self._specs[target].items() if key in LIMIT_KEYS})
+                    self._limiters[target] = limiter
+        return limiter
+
+    @contextmanager
+    def limit(self, plugin_name: str, method: str = None):
+        """Hold the limits of a plugin and of one of its methods around a call.
+
+        Limits are reentrant per call chain: a target already held further up
+        the chain is not acquired again, so nested calls cannot wait on themselves.
+        """
+        held = _held.get()
+        targets = [plugin_name] + ([f"{plugin_name}.{method}"] if method else [])
+        limiters = [limiter for limiter in (self.get(target) for target in targets if target not in held)
+                    if limiter is not None]
+        if not limiters:
+            yield
+            return
+        token = _held.set(held | {limiter.name for limiter in limiters})
+        try:
+            with ExitStack() as stack:
+                for limiter in limiters:
+                    stack.enter_context(limiter)
+                yield
+        finally:
+            _held.reset(token)
+
+
+xlimits = LimitRegistry()
@@ -0,0 +1,390 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from xplugin.logger import xlogger
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RETIRED = "retired.json"  # counters and histograms of processes that have exited
+
+
+class _Metric:
+    """Base class for a labelled metric family."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str = "", labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.reset()
+
+    def reset(self):
+        # A fresh lock too: one inherited through fork may be held by a thread that did not survive it
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []   # (thread, shard) pairs, one per writing thread
+        self._retired = {}  # values folded in from threads that have exited
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _shard(self) -> dict:
+        # Each thread writes only to its own shard, so the hot path takes no lock
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _merge_value(self, current, value):
+        return (current or 0) + value
+
+    def samples(self) -> dict:
+        """Return the aggregated value for every label set."""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    for key, value in list(shard.items()):
+                        self._retired[key] = self._merge_value(self._retired.get(key), value)
+            self._shards = alive
+            merged = dict(self._retired)
+            shards = [shard for _, shard in alive]
+        for shard in shards:
+            for key, value in list(shard.items()):
+                merged[key] = self._merge_value(merged.get(key), value)
+        return merged
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in self.samples().items()],
+        }
+
+
+class Counter(_Metric):
+    """A monotonically increasing value."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down. Writes are last-one-wins, so gauges share one dict."""
+
+    type = "gauge"
+
+    def reset(self):
+        super().reset()
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, plus their sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str = "", labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # Per-bucket counts, the +Inf bucket, then sum and count
+            state = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            shard[key] = state
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent inside the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _merge_value(self, current, value):
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+    def snapshot(self) -> dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Process-local metric registry.
+
+    Every plugin process writes its own snapshot into a shared directory and
+    ``collect`` merges them, so a single ``/metrics`` scrape covers the whole node.
+    Snapshots of processes that have exited are folded into ``retired.json``:
+    their counters and histograms keep counting, their gauges are dropped.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.path = None
+        self.flush_interval = 5.0
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._exporter_pid = None
+        self._flushed_pid = None
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = cls(name, documentation, labelnames, **kwargs)
+                    self.metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.type}")
+        return metric
+
+    def counter(self, name: str, documentation: str = "", labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str = "", labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str = "", labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def reset(self):
+        """Drop all recorded values, e.g. in a freshly forked plugin process."""
+        for metric in list(self.metrics.values()):
+            metric.reset()
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    # Cross-process aggregation
+
+    def configure(self, path: str = None, flush_interval: float = 5.0, clear: bool = True):
+        """Set the directory where per-process snapshots are exchanged."""
+        self.path = path or os.getenv("XSOC_METRICS_DIR") or os.path.join(tempfile.gettempdir(), "xsoc-metrics")
+        self.flush_interval = flush_interval
+        os.makedirs(self.path, exist_ok=True)
+        if clear:
+            for file_name in os.listdir(self.path):
+                if file_name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.path, file_name))
+                    except OSError:
+                        pass
+        xlogger.debug(f"Metrics snapshots will be written to {self.path}")
+
+    def flush(self):
+        """Write this process' snapshot atomically to the shared directory."""
+        if not self.path:
+            return
+        target = os.path.join(self.path, f"{os.getpid()}.json")
+        tmp = f"{target}.tmp"
+        if self._flushed_pid != os.getpid():
+            # A snapshot under our pid before our first flush was left by an exited process that had the same pid
+            if os.path.exists(target):
+                self._retire(f"{os.getpid()}.json")
+            self._flushed_pid = os.getpid()
+        try:
+            with open(tmp, "w") as file:
+                json.dump(self.snapshot(), file)
+            os.replace(tmp, target)
+        except OSError as e:
+            xlogger.error(f"Error writing metrics snapshot: {e}")
+
+    def start_exporter(self):
+        """Start a daemon thread that flushes this process' snapshot periodically."""
+        if not self.path or (self._exporter and self._exporter_pid == os.getpid()):
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        self._exporter = threading.Thread(target=_run, name="xsoc-metrics-exporter", daemon=True)
+        self._exporter_pid = os.getpid()
+        self._exporter.start()
+
+    def fork_child(self):
+        """Reset inherited values and start exporting from a newly forked process."""
+        self._lock = threading.Lock()
+        self.reset()
+        self.start_exporter()
+
+    def collect(self) -> dict:
+        """Merge the snapshots of all processes, replacing our own with live values."""
+        snapshots = [self.snapshot()]
+        if self.path and os.path.isdir(self.path):
+            own = f"{os.getpid()}.json"
+            for file_name in os.listdir(self.path):
+                if not file_name.endswith(".json") or file_name in (own, RETIRED):
+                    continue
+                if not _alive(file_name[:-5]):
+                    self._retire(file_name)
+                    continue
+                self._read_snapshot(file_name, snapshots)
+            # Read last, so it includes the processes retired on the way
+            self._read_snapshot(RETIRED, snapshots)
+        return merge_snapshots(snapshots)
+
+    def _read_snapshot(self, file_name: str, snapshots: list):
+        try:
+            with open(os.path.join(self.path, file_name), "r") as file:
+                snapshots.append(json.load(file))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            xlogger.debug(f"Skipping metrics snapshot {file_name}: {e}")
+
+    def _retire(self, file_name: str):
+        """Fold the counters and histograms of an exited process into the retired snapshot."""
+        path = os.path.join(self.path, file_name)
+        retired = os.path.join(self.path, RETIRED)
+        with open(os.path.join(self.path, "retired.lock"), "a") as lock:
+            # Every process may collect, so only one of them folds a given snapshot
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(path, "r") as file:
+                        snapshot = json.load(file)
+                except FileNotFoundError:
+                    return
+                except (OSError, ValueError) as e:
+                    xlogger.debug(f"Dropping unreadable metrics snapshot {file_name}: {e}")
+                    snapshot = {}
+                snapshots = [{name: family for name, family in snapshot.items() if family.get("type") != "gauge"}]
+                try:
+                    with open(retired, "r") as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    pass
+                tmp = f"{retired}.{os.getpid()}.tmp"
+                with open(tmp, "w") as file:
+                    json.dump(merge_snapshots(snapshots), file)
+                os.replace(tmp, retired)
+                os.remove(path)
+            except OSError as e:
+                xlogger.error(f"Error retiring metrics snapshot {file_name}: {e}")
+            finally:
+                fcntl.lockf(lock, fcntl.LOCK_UN)
+
+    def render(self) -> str:
+        return render_prometheus(self.collect())
+
+
+def _alive(pid: str) -> bool:
+    """Whether the process that wrote a snapshot is still running; files not named by a pid count as live."""
+    if not pid.isdigit() or int(pid) == 0:
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_snapshots(snapshots: list) -> dict:
+    """Merge several registry snapshots. Counters, gauges and histogram buckets are summed."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, {**family, "samples": {}})
+            for labels, value in family["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    for family in merged.values():
+        family["samples"] = [[list(key), value] for key, value in family["samples"].items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labels, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted(snapshot):
+        family = snapshot[name]
+        labelnames = family.get("labelnames", [])
+        if family.get("help"):
+            lines.append(f"# HELP {name} {_escape(family['help'])}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in sorted(family["samples"]):
+            if family["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(list(family["buckets"]) + [float("inf")], value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, ('le', _format_value(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+xmetrics = MetricsRegistry()
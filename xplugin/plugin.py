@@ -1,4 +1,11 @@
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from xplugin.tracing import xtracer
+from xplugin.limits import xlimits
+
+
+_tool_calls = xmetrics.counter("xsoc_tool_calls_total", "Tool invocations", ("plugin", "tool"))
+_tool_errors = xmetrics.counter("xsoc_tool_errors_total", "Tool invocations that raised", ("plugin", "tool"))
 
 class Plugin:
 
@@ -8,6 +15,7 @@ class Plugin:
     enabled = True
     tools = []
     is_built_in = False
+    limits = {}  # e.g. {"max_concurrency": 4, "methods": {"lookup": {"rate": 5}}}, overridden by config.yaml
 
     def __init__(self, built_in: bool = False):
         # Subclass initialization logic
@@ -45,6 +53,10 @@ class Plugin:
     def shutdown(self):
         """Shutdown the plugin gracefully"""
         pass
+
+    def process_exit(self):
+        """Release what this plugin opened in the current process. Called before a plugin process exits."""
+        pass
     
     def is_shutdown_requested(self):
         """Check if shutdown has been requested"""
@@ -73,7 +85,13 @@ class Plugin:
         xlogger.debug(self.tools)
         for tool in self.tools:
             if tool.__name__ == tool_name:
-                return tool(*args, **kwargs)
+                _tool_calls.inc(plugin=self.name, tool=tool_name)
+                try:
+                    with xlimits.limit(self.name, tool_name), xtracer.span(f"tool.{tool_name}", plugin=self.name):
+                        return tool(*args, **kwargs)
+                except Exception:
+                    _tool_errors.inc(plugin=self.name, tool=tool_name)
+                    raise
         raise ValueError(f"Tool {tool_name} not found")
     
     def get_method_names(self):
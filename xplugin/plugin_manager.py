@@ -1,8 +1,20 @@
 from multiprocessing import Process, Event
 from xplugin.logger import xlogger
+from xplugin.metrics import xmetrics
+from xplugin.tracing import xtracer
+from xplugin.profiler import xprofiler
+from xplugin.limits import xlimits
+from xplugin.config import diff
 import os
+import time
 
 
+_plugin_loads = xmetrics.counter("xsoc_plugin_loads_total", "Plugin load attempts", ("plugin", "status"))
+_plugin_load_seconds = xmetrics.histogram("xsoc_plugin_load_seconds", "Time spent importing and instantiating a plugin", ("plugin",))
+_plugins_registered = xmetrics.gauge("xsoc_plugins_registered", "Number of registered plugins")
+_plugin_processes = xmetrics.gauge("xsoc_plugin_processes_active", "Number of running plugin processes")
+_plugin_errors = xmetrics.counter("xsoc_plugin_errors_total", "Unhandled errors raised by plugin processes", ("plugin",))
+
 
 class PluginManager:
 
@@ -19,7 +31,9 @@ class PluginManager:
 
 
     def __init__(self):
-        pass
+        self.plugin_specs = {}
+        self.plugin_processes = {}
+        self.stop_events = {}
 
 
     def load_startup_config(self, path: str):
@@ -37,6 +51,8 @@ class PluginManager:
     def load_plugin(self, plugin_name, builtin: bool = False):
         """Dynamically load a plugin by name"""
         xlogger.debug(f"Loading plugin: {plugin_name}")
+        start = time.perf_counter()
+        status = "error"
         try:
             module_name = f"plugins.builtin.{plugin_name}" if builtin else f"plugins.custom.{plugin_name}"
             module = __import__(module_name, fromlist=[''])
@@ -47,6 +63,7 @@ class PluginManager:
                 plugin_instance.register_variable("plugin_manager", self)
                 self.register_plugin(plugin_instance, builtin=builtin)
                 xlogger.debug(f"Plugin {plugin_name} loaded successfully")
+                status = "ok"
                 return plugin_instance
             else:
                 xlogger.error(f"Plugin class {plugin_class_name} not found in module {module_name}")
@@ -54,6 +71,9 @@ class PluginManager:
         except Exception as e:
             xlogger.error(f"Error loading plugin {plugin_name}: {e}")
             return None
+        finally:
+            _plugin_loads.inc(plugin=plugin_name, status=status)
+            _plugin_load_seconds.observe(time.perf_counter() - start, plugin=plugin_name)
         
     def startup(self):
         """Run startup plugins"""
@@ -71,34 +91,181 @@ class PluginManager:
                         xlogger.debug(f"Plugin {plugin_name} not found, attempting to load...")
                         plugin = self.load_plugin(plugin_name)
                     if plugin:
-                        xlogger.debug(f"Running startup plugin: {plugin.name}")
-                        for _plugin, _kwargs in plugin.load_config(context):
-                            if _plugin.separate_process:
-                                xlogger.debug(f"Plugin {_plugin.name} is set to run in a separate process")
-                                
-                                # Run plugin in a separate process
-                                process = Process(target=self._plugin_wrapper, args=(_plugin, self.shutdown_event, ), kwargs=_kwargs)
-                                process.name = f"Plugin-{_plugin.name}"
-                                self.active_processes.append(process)
-                                xlogger.debug(f"Starting process for plugin: {_plugin.name}")
-                                process.start()
-                                xlogger.debug(f"Started process for plugin: {_plugin.name}")
-                            else:
-                                _plugin.run(**_kwargs)
+                        self._launch(plugin, startup_name, context)
                     else:
                         xlogger.error(f"Startup plugin {plugin_name} could not be loaded")
-            if self.active_processes:
-                xlogger.debug(f"Running with {len(self.active_processes)} plugin processes")
-                try:
-                    while not self.shutdown_event.is_set() and any(t.is_alive() for t in self.active_processes):
-                        self.shutdown_event.wait(timeout=1.0)
-                except KeyboardInterrupt:
-                    xlogger.debug("KeyboardInterrupt received, shutting down...")
-                    self.shutdown_event.set()
         except Exception as e:
             xlogger.error(f"Error during startup: {e}")
             self.shutdown_event.set()
+        self.serve()
+
+
+    def _launch(self, plugin, startup_name: str, context: dict):
+        """Run one startup entry of a plugin, in-process or in separate processes."""
+        xlogger.debug(f"Running startup plugin: {plugin.name}")
+        stop_event = self.stop_events.setdefault(plugin.name, Event())
+        for _plugin, _kwargs in plugin.load_config(context):
+            if _plugin is None:
+                continue
+            if _plugin.separate_process:
+                xlogger.debug(f"Plugin {_plugin.name} is set to run in a separate process")
+
+                # Run plugin in a separate process, handing over the trace context
+                with xtracer.span("plugin.start", plugin=_plugin.name, startup=startup_name):
+                    process = Process(target=self._plugin_wrapper, args=(_plugin, stop_event, xtracer.inject()), kwargs=_kwargs)
+                    process.name = f"Plugin-{_plugin.name}"
+                    self.active_processes.append(process)
+                    self.plugin_processes.setdefault(plugin.name, []).append(process)
+                    xlogger.debug(f"Starting process for plugin: {_plugin.name}")
+                    process.start()
+                self._record_event(_plugin.name, "process_started", f"pid={process.pid}")
+                _plugin_processes.set(len(self.active_processes))
+                xlogger.debug(f"Started process for plugin: {_plugin.name}")
+            else:
+                with xtracer.span("plugin.run", plugin=_plugin.name, startup=startup_name):
+                    _plugin.run(**_kwargs)
+
+
+    def start_plugin(self, spec: dict):
+        """Load a fresh instance of a plugin, apply its params and run its startup entries."""
+        plugin = self._load_spec(spec)
+        if plugin:
+            self._run_startups(plugin, spec)
+        return plugin
+
+
+    def _load_spec(self, spec: dict):
+        self.stop_events[spec["name"]] = Event()
+        plugin = self.load_plugin(spec["name"], builtin=spec.get("builtin", False))
+        if not plugin:
+            xlogger.error(f"Plugin {spec['name']} could not be loaded")
+            return None
+        if spec.get("params") and hasattr(plugin, "configure"):
+            plugin.configure(**spec["params"])
+        if spec.get("limits"):
+            xlimits.declare(plugin.name, spec["limits"])
+        return plugin
+
+
+    def _run_startups(self, plugin, spec: dict):
+        for startup in spec.get("startups", []):
+            xlogger.info(f"Starting up: {startup['name']}")
+            try:
+                self._launch(plugin, startup["name"], startup.get("context") or {})
+            except Exception as e:
+                xlogger.error(f"Error starting {startup['name']}: {e}")
+
+
+    def stop_plugin(self, plugin_name: str, unregister: bool = False, timeout: float = 5.0):
+        """Stop the processes of one plugin, leaving every other plugin running."""
+        xlogger.info(f"Stopping plugin: {plugin_name}")
+        stop_event = self.stop_events.pop(plugin_name, None)
+        if stop_event:
+            stop_event.set()
+        processes = self.plugin_processes.pop(plugin_name, [])
+        for process in processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                xlogger.warning(f"Process {process.name} did not stop in {timeout}s, terminating")
+                process.terminate()
+                process.join(timeout=timeout)
+            if process in self.active_processes:
+                self.active_processes.remove(process)
+        _plugin_processes.set(len(self.active_processes))
+        plugin_info = self.plugins.get(plugin_name)
+        # Recorded first: stopping the database plugin stops the history store itself
+        self._record_event(plugin_name, "stopped")
+        if plugin_info and not plugin_info["instance"].separate_process:
+            # In-process plugins own resources in this process, e.g. the database writer
+            try:
+                plugin_info["instance"].shutdown()
+            except Exception as e:
+                xlogger.error(f"Error shutting down plugin {plugin_name}: {e}")
+        if unregister:
+            self.plugins.pop(plugin_name, None)
+            xlimits.declare(plugin_name, None)
+            _plugins_registered.set(len(self.plugins))
+
+
+    def _dependency_order(self, specs: dict, names) -> list:
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered or name in visiting:
+                return
+            visiting.add(name)
+            for dependency in specs.get(name, {}).get("dependencies", []):
+                visit(dependency)
+            visiting.discard(name)
+            if name in names:
+                ordered.append(name)
+
+        for name in sorted(names):
+            visit(name)
+        return ordered
+
+
+    def apply_plugin_specs(self, specs: dict) -> dict:
+        """Bring running plugins in line with ``specs``, touching only those whose config changed.
+
+        Plugins depending on a restarted plugin are restarted as well, since
+        their processes hold a reference to the old instance.
+        """
+        old = self.plugin_specs
+        added = specs.keys() - old.keys()
+        removed = old.keys() - specs.keys()
+        changed = {name for name in specs.keys() & old.keys() if diff(old[name], specs[name])}
+        restart = set(changed)
+        while True:
+            dependents = {name for name, spec in specs.items()
+                          if name in old and name not in restart and restart & set(spec.get("dependencies", []))}
+            if not dependents:
+                break
+            restart |= dependents
+        for name in changed:
+            xlogger.info(f"Plugin {name} changed: {diff(old[name], specs[name])}")
+
+        for name in reversed(self._dependency_order(old, removed | restart)):
+            self.stop_plugin(name, unregister=name in removed)
+        # Load every plugin before running any startup, so steps can call plugins loaded later
+        started = []
+        for name in self._dependency_order(specs, added | restart):
+            plugin = self._load_spec(specs[name])
+            if plugin:
+                started.append((plugin, specs[name]))
+        for plugin, spec in started:
+            self._run_startups(plugin, spec)
+        self.plugin_specs = specs
+        summary = {"added": sorted(added), "removed": sorted(removed), "restarted": sorted(restart)}
+        xlogger.info(f"Plugin configuration applied: {summary}")
+        return summary
+
+
+    def serve(self, reload_event=None, on_reload=None):
+        """Wait for plugin processes, applying reloads until shutdown.
+
+        Without a reload event the manager returns once every plugin process
+        has exited, as it always has.
+        """
+        if self.active_processes:
+            xlogger.debug(f"Running with {len(self.active_processes)} plugin processes")
+        try:
+            while not self.shutdown_event.is_set():
+                if reload_event is not None and reload_event.is_set():
+                    reload_event.clear()
+                    try:
+                        on_reload()
+                    except Exception as e:
+                        xlogger.error(f"Error reloading configuration, keeping the current one: {e}")
+                if reload_event is None and not any(t.is_alive() for t in self.active_processes):
+                    break
+                self.shutdown_event.wait(timeout=1.0)
+        except KeyboardInterrupt:
+            xlogger.debug("KeyboardInterrupt received, shutting down...")
+            self.shutdown_event.set()
         finally:
+            for stop_event in self.stop_events.values():
+                stop_event.set()
             self.cleanup_processes()
 
 
@@ -115,16 +282,40 @@ class PluginManager:
                     xlogger.warning(f"Process {process.name} did not finish gracefully")
         
         self.active_processes.clear()
+        self.plugin_processes.clear()
+        _plugin_processes.set(0)
+        history = self.get_history_store()
+        if history:
+            history.flush()
         xlogger.debug("Process cleanup completed")
 
 
-    def _plugin_wrapper(self, plugin, shutdown_event, **kwargs):
+    def _plugin_wrapper(self, plugin, shutdown_event, trace_context=None, **kwargs):
         """Wrapper function to run plugins with shutdown event monitoring"""
+        # Values inherited through fork belong to the parent's snapshot
+        xmetrics.fork_child()
+        plugin.shutdown_event = shutdown_event
+        xprofiler.register(plugin.name)
         try:
-            plugin.run(**kwargs)
+            with xtracer.span("plugin.run", parent=trace_context, plugin=plugin.name, pid=os.getpid()):
+                plugin.run(**kwargs)
         except Exception as e:
+            _plugin_errors.inc(plugin=plugin.name)
+            self._record_event(plugin.name, "error", repr(e))
             xlogger.error(f"Error in plugin {plugin.name}: {e}")
         finally:
+            self._record_event(plugin.name, "process_finished")
+            history = self.get_history_store()
+            if history:
+                history.flush()
+            # Plugins used from this process (e.g. the alert store from workflow steps) seal what they wrote
+            for plugin_info in list(self.plugins.values()):
+                try:
+                    plugin_info["instance"].process_exit()
+                except Exception as e:
+                    xlogger.error(f"Error releasing {plugin_info['instance'].name} in plugin {plugin.name} process: {e}")
+            xmetrics.flush()
+            xprofiler.unregister()
             xlogger.debug(f"Plugin {plugin.name} process finished")
 
 
@@ -135,6 +326,24 @@ class PluginManager:
             "instance": plugin,
             "builtin": builtin
         }
+        xlimits.declare(plugin.name, plugin.limits)
+        _plugins_registered.set(len(self.plugins))
+        self._record_event(plugin.name, "registered", "builtin" if builtin else "custom")
+
+
+    def get_history_store(self):
+        """Return the database plugin if it is registered, otherwise None."""
+        plugin_info = self.plugins.get("database")
+        return plugin_info["instance"] if plugin_info else None
+
+
+    def _record_event(self, plugin_name: str, event: str, detail: str = None):
+        history = self.get_history_store()
+        if history:
+            try:
+                history.record_plugin_event(plugin_name, event, detail)
+            except Exception as e:
+                xlogger.debug(f"Could not record plugin event {event} for {plugin_name}: {e}")
 
 
     def get_plugin(self, plugin_name: str):
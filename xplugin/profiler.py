@@ -0,0 +1,186 @@
+from collections import Counter
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from xplugin.logger import xlogger
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """Sample the stacks of every other thread in this process for ``seconds``."""
+    counts = Counter()
+    own = threading.get_ident()
+    names = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        if len(names) != len(frames):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def process_start_time(pid: int):
+    """Start time of ``pid`` in clock ticks since boot, or None where /proc is not available.
+
+    Together with the pid it identifies a process, even once the pid is reused.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as file:
+            data = file.read()
+        # The command name may contain spaces and parentheses; fields resume after the last ")"
+        return int(data[data.rindex(")") + 2:].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def collapse(counts: Counter) -> str:
+    """Format sampled stacks in the collapsed format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class ProfilerControl:
+    """Let any process ask a running plugin process for a stack profile.
+
+    Plugin processes register their pid and plugin name in a shared directory
+    and listen for ``SIGUSR2``. A requester writes the desired duration next to
+    the registration, signals the process and waits for the collapsed output.
+    A registration also records the process start time, so a process that
+    merely reuses a registered pid is never signalled: ``SIGUSR2`` would
+    terminate it.
+    """
+
+    def __init__(self):
+        self.path = None
+
+    def configure(self, path: str = None, clear: bool = True):
+        self.path = path or os.getenv("XSOC_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "xsoc-profiles")
+        os.makedirs(self.path, exist_ok=True)
+        if clear:
+            # Registrations of a previous run, e.g. of terminated plugin processes
+            for file_name in os.listdir(self.path):
+                try:
+                    os.remove(os.path.join(self.path, file_name))
+                except OSError:
+                    pass
+
+    def _file(self, pid: int, suffix: str) -> str:
+        return os.path.join(self.path, f"{pid}.{suffix}")
+
+    def register(self, plugin_name: str):
+        """Advertise this process as profilable under ``plugin_name``."""
+        if not self.path or not hasattr(signal, "SIGUSR2"):
+            return
+        if threading.current_thread() is not threading.main_thread():
+            xlogger.debug("Profiler signal handler can only be installed from the main thread")
+            return
+        signal.signal(signal.SIGUSR2, self._on_signal)
+        with open(self._file(os.getpid(), "json"), "w") as file:
+            json.dump({"plugin": plugin_name, "pid": os.getpid(), "start_time": process_start_time(os.getpid())}, file)
+
+    def unregister(self):
+        if not self.path:
+            return
+        for suffix in ("json", "request"):
+            try:
+                os.remove(self._file(os.getpid(), suffix))
+            except OSError:
+                pass
+
+    def _on_signal(self, signum, frame):
+        # Sample from a separate thread so the interrupted code keeps running
+        threading.Thread(target=self._profile_to_file, name="xsoc-profiler", daemon=True).start()
+
+    def _profile_to_file(self):
+        pid = os.getpid()
+        try:
+            with open(self._file(pid, "request"), "r") as file:
+                seconds = float(file.read().strip() or 5)
+        except (OSError, ValueError):
+            seconds = 5.0
+        output = collapse(sample_stacks(seconds))
+        tmp = self._file(pid, "collapsed.tmp")
+        with open(tmp, "w") as file:
+            file.write(output)
+        os.replace(tmp, self._file(pid, "collapsed"))
+
+    def processes(self) -> list:
+        """List registered plugin processes that are still alive."""
+        if not self.path or not os.path.isdir(self.path):
+            return []
+        processes = []
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.path, file_name)
+            try:
+                with open(path, "r") as file:
+                    info = json.load(file)
+                os.kill(info["pid"], 0)
+                if process_start_time(info["pid"]) != info.get("start_time"):
+                    raise ProcessLookupError(f"pid {info['pid']} belongs to another process now")
+            except ProcessLookupError:
+                # Left behind by a process that was killed before it could unregister
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            except (OSError, ValueError, KeyError):
+                continue
+            processes.append(info)
+        return processes
+
+    def profile(self, plugin_name: str, seconds: float = 5.0) -> str:
+        """Profile every process of ``plugin_name`` and return the combined collapsed stacks."""
+        if plugin_name in (None, "", "self"):
+            return collapse(sample_stacks(seconds))
+        targets = [info["pid"] for info in self.processes() if info["plugin"] == plugin_name]
+        if not targets:
+            raise ValueError(f"No running process found for plugin {plugin_name}")
+        for pid in targets:
+            try:
+                os.remove(self._file(pid, "collapsed"))
+            except OSError:
+                pass
+            with open(self._file(pid, "request"), "w") as file:
+                file.write(str(seconds))
+            os.kill(pid, signal.SIGUSR2)
+        counts = Counter()
+        deadline = time.monotonic() + seconds + 5.0
+        pending = set(targets)
+        while pending and time.monotonic() < deadline:
+            time.sleep(0.1)
+            for pid in list(pending):
+                output = self._file(pid, "collapsed")
+                if os.path.exists(output):
+                    with open(output, "r") as file:
+                        for line in file:
+                            stack, _, count = line.rstrip("\n").rpartition(" ")
+                            counts[f"pid-{pid};{stack}"] += int(count)
+                    os.remove(output)
+                    pending.discard(pid)
+        if pending:
+            xlogger.warning(f"No profile received from processes {sorted(pending)}")
+        return collapse(counts)
+
+
+xprofiler = ProfilerControl()
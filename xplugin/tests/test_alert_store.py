@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+
+from plugins.builtin.alert_store import AlertStorePlugin
+from plugins.builtin.alert_store.storage import EventStore
+
+
+FIELDS = {"ip": ["src_ip", "dst_ip"], "hash": ["sha256"]}
+
+
+class TestEventStore:
+    def setup_method(self):
+        self.now = time.time()
+
+    def test_query_active_and_sealed(self, tmp_path):
+        store = EventStore(str(tmp_path), FIELDS, partition_seconds=3600, segment_bytes=2048)
+        for i in range(200):
+            store.append({"timestamp": self.now - i * 60, "src_ip": f"10.0.0.{i % 10}", "sha256": f"h{i}"})
+        assert store.stats()["segments"] > 1
+        assert store.seen("hash", "h150")
+        assert not store.seen("hash", "h150", since=self.now - 3600)
+        assert len(store.query("ip", "10.0.0.3")) == 20
+        store.close()
+
+    def test_reopen_after_close(self, tmp_path):
+        store = EventStore(str(tmp_path), FIELDS)
+        store.append({"timestamp": self.now, "dst_ip": "192.0.2.1", "sha256": "abc"})
+        store.close()
+        reopened = EventStore(str(tmp_path), FIELDS)
+        assert [event["sha256"] for _, event in reopened.query("ip", "192.0.2.1")] == ["abc"]
+        reopened.close()
+
+    def test_recover_unsealed_segment(self, tmp_path):
+        store = EventStore(str(tmp_path), FIELDS)
+        store.append({"timestamp": self.now, "sha256": "lost"})
+        store.flush()
+        # Simulate a crash: drop the active segment without sealing it
+        for active in store._active.values():
+            active.file.close()
+        store._active.clear()
+        recovered = EventStore(str(tmp_path), FIELDS)
+        recovered._sequence = 100
+        assert recovered.seen("hash", "lost")
+
+    def test_retention_runs_without_run(self, tmp_path):
+        old = {"timestamp": self.now - 30 * 86400, "sha256": "old"}
+        plugin = AlertStorePlugin()
+        plugin.configure(path=str(tmp_path), fields=FIELDS, retention_days=7)
+        plugin.append(old)
+        plugin.process_exit()
+        # Opening the store applies retention
+        assert not plugin.seen("hash", "old", days=None)
+        plugin.process_exit()
+
+        store = EventStore(str(tmp_path), FIELDS, partition_seconds=86400, retention_days=7, retention_interval=0)
+        store.append(old)
+        # ...and so does opening a new segment once the interval has passed
+        store.append({"timestamp": self.now, "sha256": "new"})
+        assert not store.seen("hash", "old")
+        assert store.seen("hash", "new")
+        store.close()
+
+    def test_retention_drops_partitions(self, tmp_path):
+        store = EventStore(str(tmp_path), FIELDS, partition_seconds=86400, retention_days=7)
+        store.append({"timestamp": self.now - 30 * 86400, "sha256": "old"})
+        store.append({"timestamp": self.now, "sha256": "new"})
+        assert store.apply_retention() == 1
+        assert not store.seen("hash", "old")
+        assert store.seen("hash", "new")
+        store.close()
+
+    def test_events_of_other_processes(self, tmp_path):
+        reader = EventStore(str(tmp_path), FIELDS)
+        appended, done = multiprocessing.Event(), multiprocessing.Event()
+
+        def live_writer():
+            store = EventStore(str(tmp_path), FIELDS, checkpoint_bytes=1024)
+            store.append({"timestamp": self.now, "sha256": "live"})
+            for i in range(100):
+                store.append({"timestamp": self.now, "sha256": f"h{i}"})
+            store.flush()
+            appended.set()
+            done.wait(5)
+            os._exit(0)  # Exit without sealing, like a killed plugin process
+
+        def plugin_writer():
+            plugin = AlertStorePlugin()
+            plugin.configure(path=str(tmp_path), fields=FIELDS)
+            plugin.append({"timestamp": self.now, "sha256": "abc"})
+            plugin.process_exit()
+
+        process = multiprocessing.Process(target=live_writer)
+        process.start()
+        assert appended.wait(5)
+        assert reader.seen("hash", "live") and reader.seen("hash", "h99")
+        # Published index blocks are searched, only the short unpublished tail is parsed
+        tail = next(iter(reader._tails.values()))
+        assert tail.blocks and tail.size - tail.indexed < 1024
+        done.set()
+        process.join(5)
+        # The writer is gone, so the reader seals its segment on the next lookup
+        assert reader.seen("hash", "live")
+        assert reader.stats()["segments"] == 1
+
+        process = multiprocessing.Process(target=plugin_writer)
+        process.start()
+        process.join(5)
+        assert reader.seen("hash", "abc")
+        assert reader.stats()["segments"] == 2
+        reader.close()
@@ -0,0 +1,109 @@
+import os
+import threading
+
+import pytest
+
+from plugins.builtin.workflow import WorkflowPlugin
+from xplugin.config import ConfigError, ConfigWatcher, diff, load_yaml, plugin_specs, validate
+from xplugin.plugin_manager import PluginManager
+
+
+CONFIG = {
+    "debug": True,
+    "plugins": {
+        "workflow": {"builtin": True, "startup": True, "params": {"workflow_path": "./example/workflows/"}},
+        "cron": {"builtin": True, "dependencies": ["workflow"], "params": {"cron_path": "./example/crons/"}},
+        "hello_world": {"enabled": False},
+    },
+}
+
+
+class TestConfig:
+    def test_validate_reports_all_errors(self):
+        with pytest.raises(ConfigError) as error:
+            validate({"debug": "yes", "plugins": {"web": {"enabled": 1, "dependencies": "workflow"}}}, "config")
+        message = str(error.value)
+        assert "debug: expected boolean" in message
+        assert "plugins.web.enabled: expected boolean" in message
+        assert "plugins.web.dependencies: expected array" in message
+
+    def test_startup_requires_plugin(self):
+        with pytest.raises(ConfigError):
+            validate({"startups": [{"main": {"context": {}}}]}, "startup")
+
+    def test_load_yaml_caches_until_changed(self, tmp_path):
+        path = tmp_path / "config.yaml"
+        path.write_text("debug: true\n")
+        first = load_yaml(str(path), "config")
+        assert load_yaml(str(path), "config") is first
+        path.write_text("debug: false\nplugins: {}\n")
+        assert load_yaml(str(path), "config") == {"debug": False, "plugins": {}}
+
+    def test_diff(self):
+        old = {"params": {"port": 8080, "host": "localhost"}, "enabled": True}
+        new = {"params": {"port": 9090}, "builtin": True, "enabled": True}
+        assert diff(old, new) == [("builtin", "added"), ("params.host", "removed"), ("params.port", "changed")]
+
+    def test_plugin_specs(self):
+        specs = plugin_specs(CONFIG, {"startups": [{"nightly": {"plugin": "cron", "context": {"cron_path": "/tmp"}}}]})
+        assert set(specs) == {"workflow", "cron"}
+        assert specs["workflow"]["startups"] == [{"name": "workflow", "context": {"workflow_path": "./example/workflows/"}}]
+        assert specs["cron"]["startups"] == [{"name": "nightly", "context": {"cron_path": "/tmp"}}]
+
+    def test_watcher_follows_new_paths(self, tmp_path):
+        old, new = tmp_path / "old.yaml", tmp_path / "new.yaml"
+        old.write_text("startups: []\n")
+        new.write_text("startups: []\n")
+        watcher = ConfigWatcher([str(old)], interval=0.01)
+        watcher.start()
+        try:
+            watcher.set_paths([str(new)])
+            old.write_text("startups: [changed]\n")
+            assert not watcher.reload_requested.wait(0.1)
+            new.write_text("startups: [changed]\n")
+            assert watcher.reload_requested.wait(2)
+        finally:
+            watcher.stop()
+
+
+class TestApplyPluginSpecs:
+    def setup_method(self):
+        self.manager = PluginManager()
+
+    def test_only_changed_plugins_restart(self):
+        specs = {"hello_world": {"name": "hello_world", "builtin": False, "params": {}, "dependencies": [], "startups": []}}
+        assert self.manager.apply_plugin_specs(specs)["added"] == ["hello_world"]
+        instance = self.manager.get_plugin("hello_world")
+        assert self.manager.apply_plugin_specs(specs) == {"added": [], "removed": [], "restarted": []}
+        assert self.manager.get_plugin("hello_world") is instance
+        changed = {"hello_world": {**specs["hello_world"], "params": {"greeting": "hi"}}}
+        assert self.manager.apply_plugin_specs(changed)["restarted"] == ["hello_world"]
+        assert self.manager.get_plugin("hello_world") is not instance
+        assert self.manager.apply_plugin_specs({})["removed"] == ["hello_world"]
+        assert self.manager.get_plugin("hello_world") is None
+
+    def test_restarting_the_database_leaves_one_writer(self, tmp_path):
+        spec = {"name": "database", "builtin": True, "params": {"path": str(tmp_path / "a.db")}, "dependencies": [], "startups": []}
+        self.manager.apply_plugin_specs({"database": spec})
+        old = self.manager.get_history_store()
+        old.record_plugin_event("web", "registered")
+        moved = {"database": {**spec, "params": {"path": str(tmp_path / "b.db")}}}
+        assert self.manager.apply_plugin_specs(moved)["restarted"] == ["database"]
+        self.manager.get_history_store().record_plugin_event("web", "registered")
+        writers = [thread for thread in threading.enumerate() if thread.name == "xsoc-db-writer" and thread.is_alive()]
+        assert len(writers) == 1 and old._writer not in writers
+        self.manager.apply_plugin_specs({})
+        assert not [thread for thread in threading.enumerate() if thread.name == "xsoc-db-writer" and thread.is_alive()]
+
+    def test_restarted_workflow_plugin_forgets_removed_workflows(self, tmp_path):
+        for name in ("kept", "removed"):
+            (tmp_path / f"{name}.yaml").write_text(f"name: {name}\nenabled: false\nsteps: []\n")
+        plugin = WorkflowPlugin()
+        list(plugin.load_config({"workflow_path": str(tmp_path)}))
+        assert sorted(plugin.workflows.names()) == ["kept", "removed"]
+        os.remove(tmp_path / "removed.yaml")
+        restarted = WorkflowPlugin()
+        list(restarted.load_config({"workflow_path": str(tmp_path)}))
+        assert restarted.workflows.names() == ["kept"]
+        # Other instances keep their own definitions
+        assert sorted(plugin.workflows.names()) == ["kept", "removed"]
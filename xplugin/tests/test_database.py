@@ -0,0 +1,64 @@
+import multiprocessing
+import sqlite3
+import time
+
+from plugins.builtin.database import DatabasePlugin
+
+
+class TestDatabasePlugin:
+    def setup_method(self):
+        self.db = DatabasePlugin(built_in=True)
+
+    def teardown_method(self):
+        self.db.shutdown()
+
+    def test_batched_runs_and_queries(self, tmp_path):
+        self.db.configure(path=str(tmp_path / "history.db"), flush_interval=0.05)
+        now = time.time()
+        for i in range(10):
+            self.db.record_workflow_run(f"run-{i}", "wf-a" if i % 2 else "wf-b", "ok" if i < 8 else "error", now + i, now + i + 1)
+        self.db.record_step_result("run-1", "wf-a", "step1", "tool", "print_message", "ok", now, 0.1, result="x" * 5000)
+        assert self.db.flush()
+        assert len(self.db.get_runs(workflow="wf-a")) == 5
+        assert [run["run_id"] for run in self.db.get_runs(status="error")] == ["run-9", "run-8"]
+        assert len(self.db.get_runs(since=now + 5)) == 5
+        steps = self.db.get_run_steps("run-1")
+        assert len(steps[0]["result"]) == 1024
+
+    def test_retention(self, tmp_path):
+        self.db.configure(path=str(tmp_path / "history.db"), retention_days=1)
+        self.db.record_plugin_event("web", "registered")
+        self.db.record_cron_execution("job", time.time() - 3 * 86400, time.time() - 3 * 86400, "ok")
+        self.db.flush()
+        self.db.compact()
+        assert self.db.get_cron_executions() == []
+        assert len(self.db.get_plugin_events("web")) == 1
+
+    def test_incremental_vacuum_is_enabled(self, tmp_path):
+        path = str(tmp_path / "history.db")
+        legacy = sqlite3.connect(str(tmp_path / "legacy.db"))
+        legacy.execute("PRAGMA journal_mode=WAL")
+        legacy.execute("CREATE TABLE legacy (id INTEGER)")
+        legacy.close()
+        for db_path in (path, str(tmp_path / "legacy.db")):
+            self.db.shutdown()
+            self.db.configure(path=db_path)
+            with self.db._get_pool().connection() as conn:
+                assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def test_forked_process_opens_its_own_pool(self, tmp_path):
+        self.db.configure(path=str(tmp_path / "history.db"))
+        self.db.record_plugin_event("web", "registered")
+        assert self.db.flush()
+        parent_pool = self.db.pool
+
+        def child():
+            self.db.record_plugin_event("cron", "registered")
+            assert self.db.flush()
+            assert self.db.pool is not parent_pool and self.db._inherited == [parent_pool]
+
+        process = multiprocessing.Process(target=child)
+        process.start()
+        process.join(10)
+        assert process.exitcode == 0
+        assert {event["plugin"] for event in self.db.get_plugin_events()} == {"web", "cron"}
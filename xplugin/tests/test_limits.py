@@ -0,0 +1,126 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from xplugin.limits import LimitRegistry, LimitTimeout, Limiter
+import xplugin.plugin as plugin_module
+from xplugin.plugin import Plugin
+
+
+class TestLimits:
+    def setup_method(self):
+        self.registry = LimitRegistry()
+
+    def test_rate_limit_paces_calls(self, tmp_path):
+        limiter = Limiter("target", str(tmp_path / "target.lim"), rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            with limiter:
+                pass
+        # The first call uses the burst, the other four wait 50ms each
+        assert 0.18 <= time.monotonic() - start < 1.0
+
+    def test_max_concurrency_across_threads(self, tmp_path):
+        limiter = Limiter("target", str(tmp_path / "target.lim"), max_concurrency=2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def call():
+            with limiter:
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert peak[0] == 2
+
+    def test_queue_timeout(self, tmp_path):
+        limiter = Limiter("target", str(tmp_path / "target.lim"), max_concurrency=1, queue_timeout=0.1)
+        limiter.acquire()
+        with pytest.raises(LimitTimeout):
+            limiter.acquire()
+        limiter.release()
+        limiter.acquire()
+        limiter.release()
+
+    def test_waiters_are_served_in_order(self, tmp_path):
+        limiter = Limiter("target", str(tmp_path / "target.lim"), max_concurrency=1)
+        order = []
+        limiter.acquire()
+
+        def call(index):
+            with limiter:
+                order.append(index)
+
+        threads = []
+        for index in range(5):
+            threads.append(threading.Thread(target=call, args=(index,)))
+            threads[-1].start()
+            time.sleep(0.02)
+        limiter.release()
+        for thread in threads:
+            thread.join()
+        assert order == [0, 1, 2, 3, 4]
+
+    def test_slots_are_shared_with_other_processes(self, tmp_path):
+        path = str(tmp_path / "target.lim")
+        limiter = Limiter("target", path, max_concurrency=1, queue_timeout=0.1)
+        holding, done = multiprocessing.Event(), multiprocessing.Event()
+
+        def hold():
+            with Limiter("target", path, max_concurrency=1):
+                holding.set()
+                done.wait(5)
+
+        process = multiprocessing.Process(target=hold)
+        process.start()
+        assert holding.wait(5)
+        with pytest.raises(LimitTimeout):
+            limiter.acquire()
+        done.set()
+        process.join(5)
+        limiter.acquire(timeout=1)
+        limiter.release()
+
+    def test_registry_merges_class_config_and_targets(self, tmp_path):
+        class VendorPlugin(Plugin):
+            limits = {"max_concurrency": 4, "methods": {"lookup": {"rate": 5}}}
+
+        self.registry.configure(path=str(tmp_path), targets={"vendor.lookup": {"rate": 10}})
+        self.registry.declare("vendor", VendorPlugin.limits)
+        assert self.registry.get("vendor").max_concurrency == 4
+        assert self.registry.get("vendor.lookup").rate == 10
+        assert self.registry.get("vendor.other") is None
+        self.registry.declare("vendor", None)
+        assert self.registry.get("vendor") is None
+        with self.registry.limit("unlimited", "call"):
+            pass
+
+    def test_nested_calls_do_not_wait_on_their_own_limits(self, tmp_path, monkeypatch):
+        class VendorPlugin(Plugin):
+            limits = {"max_concurrency": 1, "queue_timeout": 0.2}
+
+            def lookup(self, value):
+                return self.run_tool("normalize", value)
+
+        def normalize(value):
+            return str(value)
+
+        plugin = VendorPlugin()
+        plugin.name = "vendor"
+        plugin.tools = [normalize]
+        self.registry.configure(path=str(tmp_path))
+        self.registry.declare("vendor", VendorPlugin.limits)
+        monkeypatch.setattr(plugin_module, "xlimits", self.registry)
+        # The workflow step holds the plugin's only slot while the method calls run_tool
+        with self.registry.limit("vendor", "lookup"):
+            assert plugin.lookup(1) == "1"
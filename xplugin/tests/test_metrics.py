@@ -0,0 +1,101 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from xplugin.metrics import MetricsRegistry, merge_snapshots, render_prometheus
+
+
+class TestMetrics:
+    def setup_method(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_aggregates_threads(self):
+        counter = self.registry.counter("calls_total", "Calls", ("tool",))
+        threads = [threading.Thread(target=lambda: [counter.inc(tool="a") for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(tool="b")
+        assert counter.samples() == {("a",): 400, ("b",): 1}
+
+    def test_histogram_buckets(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        text = render_prometheus(self.registry.snapshot())
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert "latency_seconds_count 4" in text
+
+    def test_merge_snapshots(self):
+        other = MetricsRegistry()
+        self.registry.counter("runs_total").inc(2)
+        other.counter("runs_total").inc(3)
+        merged = merge_snapshots([self.registry.snapshot(), other.snapshot()])
+        assert merged["runs_total"]["samples"] == [[[], 5]]
+
+    def test_collect_reads_other_processes(self, tmp_path):
+        self.registry.configure(path=str(tmp_path))
+        other = MetricsRegistry()
+        other.path = str(tmp_path)
+        other.counter("runs_total").inc(3)
+        other.flush()
+        (tmp_path / f"{os.getpid()}.json").rename(tmp_path / "other.json")
+        self.registry.counter("runs_total").inc(1)
+        assert "runs_total 4.0" in self.registry.render()
+
+    def test_exited_processes_are_retired(self, tmp_path):
+        self.registry.configure(path=str(tmp_path))
+        process = multiprocessing.Process(target=lambda: None)
+        process.start()
+        process.join()
+        exited = MetricsRegistry()
+        exited.counter("runs_total").inc(3)
+        exited.gauge("in_flight").set(5)
+        (tmp_path / f"{process.pid}.json").write_text(json.dumps(exited.snapshot()))
+        self.registry.counter("runs_total").inc(1)
+        text = self.registry.render()
+        assert "runs_total 4.0" in text and "in_flight" not in text
+        assert not (tmp_path / f"{process.pid}.json").exists()
+        assert "runs_total 4.0" in self.registry.render()
+
+    def test_snapshot_of_a_reused_pid_is_retired(self, tmp_path):
+        self.registry.configure(path=str(tmp_path))
+        previous = MetricsRegistry()
+        previous.path = str(tmp_path)
+        previous.counter("runs_total").inc(3)
+        previous.flush()
+        # A new process with the same pid must not overwrite the old counts and make them go backwards
+        self.registry.counter("runs_total").inc(1)
+        self.registry.flush()
+        assert "runs_total 4.0" in self.registry.render()
+
+    def test_fork_child_does_not_inherit_held_locks(self):
+        counter = self.registry.counter("runs_total")
+        gauge = self.registry.gauge("in_flight")
+        counter.samples()
+
+        def child():
+            self.registry.fork_child()
+            counter.inc()
+            gauge.set(1)
+            self.registry.counter("other_total").inc()
+
+        # A scrape or exporter thread holding the locks at fork time
+        with self.registry._lock, counter._lock, gauge._lock:
+            process = multiprocessing.Process(target=child)
+            process.start()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+        assert process.exitcode == 0
+
+    def test_type_conflict(self):
+        self.registry.counter("value")
+        with pytest.raises(ValueError):
+            self.registry.gauge("value")
@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+
+import pytest
+
+from xplugin.profiler import ProfilerControl, collapse, sample_stacks
+from xplugin.tracing import Tracer
+
+
+class TestTracing:
+    def setup_method(self):
+        self.tracer = Tracer()
+
+    def test_child_spans_share_trace(self):
+        with self.tracer.span("workflow.run") as run:
+            with self.tracer.span("workflow.step") as step:
+                pass
+        assert step.trace_id == run.trace_id
+        assert step.parent_id == run.span_id
+        assert [span["name"] for span in self.tracer.recent()] == ["workflow.step", "workflow.run"]
+
+    def test_propagated_context(self):
+        with self.tracer.span("plugin.start") as start:
+            context = self.tracer.inject()
+        with self.tracer.span("plugin.run", parent=context) as run:
+            pass
+        assert run.trace_id == start.trace_id
+        assert run.parent_id == start.span_id
+
+    def test_error_status(self):
+        with pytest.raises(RuntimeError):
+            with self.tracer.span("failing"):
+                raise RuntimeError("boom")
+        assert self.tracer.recent()[-1]["status"] == "error"
+
+    def test_jsonl_export(self, tmp_path):
+        path = str(tmp_path / "traces.jsonl")
+        self.tracer.configure(path=path)
+        for i in range(5):
+            with self.tracer.span("step", index=i):
+                pass
+        spans = self.tracer.recent(limit=3)
+        assert [span["attributes"]["index"] for span in spans] == ["2", "3", "4"]
+        assert os.path.getsize(path) > 0
+
+
+def test_sample_stacks_collapsed():
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait, name="sleeper")
+    thread.start()
+    try:
+        output = collapse(sample_stacks(0.05, interval=0.01))
+    finally:
+        done.set()
+        thread.join()
+    assert any(line.startswith("sleeper;") for line in output.splitlines())
+
+
+def test_profiler_skips_stale_registrations(tmp_path):
+    (tmp_path / "1.json").write_text("{}")
+    profiler = ProfilerControl()
+    profiler.configure(path=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+    handler = signal.getsignal(signal.SIGUSR2)
+    try:
+        profiler.register("self")
+    finally:
+        signal.signal(signal.SIGUSR2, handler)
+    exited = multiprocessing.Process(target=lambda: None)
+    exited.start()
+    exited.join()
+    (tmp_path / f"{exited.pid}.json").write_text(json.dumps({"plugin": "gone", "pid": exited.pid, "start_time": 1}))
+    # A live pid whose start time differs is a different process that reused it
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps({"plugin": "reused", "pid": os.getppid(), "start_time": -1}))
+    assert [info["plugin"] for info in profiler.processes()] == ["self"]
+    assert sorted(os.listdir(tmp_path)) == [f"{os.getpid()}.json"]
+    profiler.unregister()
+    assert profiler.processes() == []
@@ -0,0 +1,15 @@
+from plugins.builtin.web import WebPlugin
+
+
+class TestWebPlugin:
+    def setup_method(self):
+        self.plugin = WebPlugin(built_in=True)
+        self.client = self.plugin.create_app().test_client()
+
+    def test_profile_is_post_only_and_opt_in(self):
+        assert self.client.get("/admin/profile?seconds=0.05").status_code == 405
+        assert self.client.post("/admin/profile", data={"seconds": 0.05}).status_code == 403
+        self.plugin.configure(host="localhost", port=8090, admin_profiling=True)
+        response = self.client.post("/admin/profile", data={"plugin": "self", "seconds": 0.05})
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == "attachment; filename=self.collapsed"
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from plugins.builtin.workflow import WorkflowPlugin
+from plugins.builtin.workflow.context import SpilledResult, StepResults, last_references
+from plugins.builtin.workflow.definitions import WorkflowDefinitions
+
+
+def _step(name, value):
+    return {"name": name, "action": "tool", "target": "concatenate_strings", "parameters": [value]}
+
+
+class TestWorkflowContext:
+    def setup_method(self):
+        self.results = StepResults(memory_budget=10_000, spill_threshold=5_000)
+
+    def teardown_method(self):
+        self.results.close()
+
+    def test_last_references(self):
+        steps = [_step("a", "x"), _step("b", "{{ steps.a }}"), _step("c", "{{ steps['a'] ~ steps.b }} steps")]
+        assert last_references(steps) == {"a": 2, "b": 2}
+        assert last_references(steps + [_step("d", "{% for s in steps %}{{ s }}{% endfor %}")]) is None
+        assert last_references(steps + [_step("d", "{{ steps.get('a') }}")]) is None
+
+    def test_large_results_spill_and_load_lazily(self, monkeypatch):
+        self.results.store("small", "x" * 100)
+        self.results.store("large", "y" * 8_000)
+        assert isinstance(self.results.raw("large"), SpilledResult)
+        assert os.path.exists(self.results.raw("large").path)
+        view = self.results.view()
+        monkeypatch.setattr(SpilledResult, "load", lambda handle: pytest.fail("membership loaded a spilled result"))
+        assert "large" in view and "missing" not in view
+        monkeypatch.undo()
+        assert self.results["large"] == "y" * 8_000
+        assert self.results["small"] == "x" * 100
+        assert "spilled result" in repr(self.results)
+
+    def test_budget_spills_largest_first(self):
+        for index in range(4):
+            self.results.store(f"r{index}", "z" * (2_000 + index * 500))
+        assert self.results.in_memory <= self.results.memory_budget
+        assert isinstance(self.results.raw("r3"), SpilledResult)
+        assert not isinstance(self.results.raw("r0"), SpilledResult)
+
+    def test_free_unreferenced_removes_spill_files(self):
+        self.results.store("a", "y" * 8_000)
+        path = self.results.raw("a").path
+        self.results.store("b", "b")
+        self.results.free_unreferenced({"a": 1, "b": 3}, 1)
+        assert list(self.results) == ["b"]
+        assert not os.path.exists(path)
+
+    def test_step_names_are_not_shadowed_in_templates(self):
+        plugin = WorkflowPlugin()
+        workflow = {
+            "name": "Shadowing",
+            "steps": [
+                _step("workflow", "first"),
+                _step("store", "second"),
+                _step("items", "third"),
+                _step("joined", "{{ steps.workflow ~ steps.store ~ steps.items ~ steps['items'] }}"),
+            ],
+        }
+        assert plugin.run_workflow(workflow) == "firstsecondthirdthird"
+        view = self.results.view()
+        self.results.store("a", "x")
+        assert view.get("a") == "x" and dict(view.items()) == {"a": "x"}
+
+    def test_definitions_return_private_copies(self):
+        definitions = WorkflowDefinitions()
+        definitions.add({"name": "wf", "env": {"var1": "World"}})
+        definitions.get("wf")["env"]["var1"] = "changed"
+        assert definitions.get("wf")["env"]["var1"] == "World"
+        assert "wf" in definitions and definitions.get("missing") is None
+
+    def test_run_workflow_with_spilled_results(self, tmp_path):
+        plugin = WorkflowPlugin()
+        plugin.configure(memory_budget_mb=0.01, spill_threshold_mb=0.005, spill_path=str(tmp_path))
+        workflow = {
+            "name": "Spill",
+            "env": {"payload": "p" * 20_000},
+            "steps": [
+                _step("capture", "{{ env.payload }}"),
+                _step("unused", "ignored"),
+                _step("summary", "{{ steps.capture | length }}"),
+            ],
+        }
+        assert plugin.run_workflow(workflow) == "20000"
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+import plugins.builtin.workflow.tools as tools
+from plugins.builtin.workflow import WorkflowPlugin
+from plugins.builtin.workflow.policies import CircuitBreaker, CircuitOpen, RetryPolicy, StepTimeout, abandoned_calls, call_with_timeout
+
+
+def _flaky(failures: int):
+    calls = []
+
+    def flaky(args):
+        calls.append(args)
+        if len(calls) <= failures:
+            raise ConnectionError("downstream unavailable")
+        return "".join(args)
+    return flaky, calls
+
+
+class TestWorkflowPolicies:
+    def setup_method(self):
+        self.plugin = WorkflowPlugin()
+
+    def _run(self, monkeypatch, tool, **policies):
+        monkeypatch.setattr(tools, "flaky", tool, raising=False)
+        workflow = {
+            "name": "Policies",
+            "steps": [
+                {"name": "call", "action": "tool", "target": "flaky", "parameters": ["{{ 'ok' }}"], **policies},
+                {"name": "after", "action": "tool", "target": "concatenate_strings", "parameters": ["{{ steps.call }}"]},
+            ],
+        }
+        return self.plugin.run_workflow(workflow)
+
+    def test_retry_delay_grows_with_jitter(self):
+        policy = RetryPolicy(max_attempts=5, backoff=1.0, max_backoff=3.0)
+        assert 0.5 <= policy.delay(1) <= 1.0
+        assert 1.0 <= policy.delay(2) <= 2.0
+        assert 1.5 <= policy.delay(4) <= 3.0
+        assert RetryPolicy.from_config(3).max_attempts == 3
+
+    def test_retry_until_success(self, monkeypatch):
+        flaky, calls = _flaky(2)
+        assert self._run(monkeypatch, flaky, retry={"max_attempts": 3, "backoff": 0.01}) == "ok"
+        # Templates are rendered again for every attempt
+        assert calls == [["ok"], ["ok"], ["ok"]]
+
+    def test_failure_without_on_error_aborts_the_run(self, monkeypatch):
+        flaky, _ = _flaky(5)
+        with pytest.raises(ConnectionError):
+            self._run(monkeypatch, flaky, retry={"max_attempts": 2, "backoff": 0.01})
+
+    def test_on_error_continue_and_fallback(self, monkeypatch):
+        flaky, _ = _flaky(5)
+        assert self._run(monkeypatch, flaky, on_error="continue") == "None"
+        fallback = {"action": "tool", "target": "concatenate_strings", "parameters": ["cached"]}
+        assert self._run(monkeypatch, flaky, on_error="fallback", fallback=fallback) == "cached"
+
+    def test_timeout(self, monkeypatch):
+        release, finished = threading.Event(), threading.Event()
+        calls = []
+
+        def slow(args):
+            calls.append(args)
+            release.wait(5)
+            finished.set()
+            return "late"
+
+        start = time.monotonic()
+        assert self._run(monkeypatch, slow, timeout=0.05, on_error="continue") == "None"
+        assert time.monotonic() - start < 1.0
+        # The timed-out call still runs, so the next one fails fast instead of starting another thread
+        assert abandoned_calls("flaky") == 1
+        with pytest.raises(StepTimeout, match="still running"):
+            self._run(monkeypatch, slow, timeout=5)
+        assert len(calls) == 1
+        release.set()
+        assert finished.wait(5)
+        for _ in range(100):
+            if not abandoned_calls("flaky"):
+                break
+            time.sleep(0.01)
+        assert self._run(monkeypatch, slow, timeout=5) == "late"
+        with pytest.raises(StepTimeout):
+            call_with_timeout(time.sleep, 0.01, 1)
+        assert call_with_timeout(sum, 1, [1, 2]) == 3
+
+    def test_circuit_breaker(self, monkeypatch):
+        breaker = CircuitBreaker("target", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with pytest.raises(CircuitOpen):
+            breaker.before_call()
+        time.sleep(0.06)
+        breaker.before_call()  # the trial call
+        with pytest.raises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+
+        flaky, calls = _flaky(100)
+        self.plugin.configure(circuit_breaker={"failure_threshold": 2, "reset_timeout": 60})
+        for _ in range(4):
+            self._run(monkeypatch, flaky, on_error="continue")
+        assert len(calls) == 2
+
+    def test_loop_until_condition_met(self):
+        start = time.monotonic()
+        values = iter([False, False, True])
+        assert tools.loop_until_condition_met(lambda: next(values), timeout=1)
+        assert not tools.loop_until_condition_met(lambda: False, timeout=0.05)
+        event = threading.Event()
+        event.set()
+        assert not tools.loop_until_condition_met(lambda: False, timeout=5, event=event)
+        assert time.monotonic() - start < 1.0
@@ -0,0 +1,223 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import tempfile
+import threading
+import time
+
+from xplugin.logger import xlogger
+
+
+_current_span = ContextVar("xsoc_current_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_time", "end_time",
+                 "attributes", "status", "pid", "_start")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.end_time = None
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self.pid = os.getpid()
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_time = self.start_time + (time.perf_counter() - self._start)
+
+    def context(self) -> dict:
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": (self.end_time - self.start_time) if self.end_time else None,
+            "attributes": {key: str(value) for key, value in self.attributes.items()},
+            "status": self.status,
+            "pid": self.pid,
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled so callers never need to check."""
+
+    trace_id = span_id = parent_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def context(self):
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class InMemoryExporter:
+    """Keep the most recent spans of this process in a ring buffer."""
+
+    def __init__(self, buffer_size: int = 1000):
+        self.spans = deque(maxlen=buffer_size)
+
+    def export(self, span: dict):
+        self.spans.append(span)
+
+    def recent(self, limit: int) -> list:
+        return list(self.spans)[-limit:]
+
+
+class JsonlExporter:
+    """Append spans to a JSONL file shared by every plugin process.
+
+    Each span is written with a single ``write`` on an ``O_APPEND`` descriptor so
+    lines from concurrent processes do not interleave.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._fd = None
+        self._pid = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+
+    def _maybe_rotate(self):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            self._open()
+            return
+        if current.st_ino != os.fstat(self._fd).st_ino:
+            # Another process rotated the file
+            self._open()
+        elif current.st_size > self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+            self._open()
+
+    def export(self, span: dict):
+        line = (json.dumps(span) + "\n").encode()
+        with self._lock:
+            try:
+                if self._fd is None or self._pid != os.getpid():
+                    self._open()
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    self._maybe_rotate()
+                os.write(self._fd, line)
+            except OSError as e:
+                xlogger.error(f"Error exporting span to {self.path}: {e}")
+
+    def recent(self, limit: int) -> list:
+        """Read the last ``limit`` spans without loading the whole file."""
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(0, os.SEEK_END)
+                position = file.tell()
+                chunk = b""
+                while position > 0 and chunk.count(b"\n") <= limit:
+                    step = min(64 * 1024, position)
+                    position -= step
+                    file.seek(position)
+                    chunk = file.read(step) + chunk
+        except FileNotFoundError:
+            return []
+        spans = []
+        for line in chunk.splitlines()[-limit:]:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+        return spans
+
+
+class Tracer:
+    """Create spans and hand finished ones to the configured exporters."""
+
+    def __init__(self):
+        self.enabled = True
+        self.memory = InMemoryExporter()
+        self.file = None
+
+    def configure(self, enabled: bool = True, path: str = None, buffer_size: int = 1000, max_bytes: int = 50 * 1024 * 1024):
+        self.enabled = enabled
+        self.memory = InMemoryExporter(buffer_size)
+        if path is None:
+            path = os.getenv("XSOC_TRACE_PATH") or os.path.join(tempfile.gettempdir(), "xsoc-traces.jsonl")
+        self.file = JsonlExporter(path, max_bytes=max_bytes) if path else None
+        xlogger.debug(f"Tracing {'enabled' if enabled else 'disabled'}, exporting to {path or 'memory'}")
+
+    def current_span(self):
+        return _current_span.get()
+
+    def inject(self) -> dict:
+        """Return the current trace context for handing to another process."""
+        span = _current_span.get()
+        return span.context() if span else None
+
+    @contextmanager
+    def span(self, name: str, parent: dict = None, **attributes):
+        """Time the block as a span, a child of ``parent`` or of the current span."""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context() if current else None
+        trace_id = parent["trace_id"] if parent else os.urandom(16).hex()
+        span = Span(name, trace_id, parent["span_id"] if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self.export(span)
+
+    def export(self, span: Span):
+        record = span.to_dict()
+        self.memory.export(record)
+        if self.file:
+            self.file.export(record)
+
+    def recent(self, limit: int = 200) -> list:
+        """Most recent spans across all processes if a file is configured, else this process only."""
+        if self.file:
+            return self.file.recent(limit)
+        return self.memory.recent(limit)
+
+    def traces(self, limit: int = 200) -> dict:
+        """Group recent spans by trace ID."""
+        traces = {}
+        for span in self.recent(limit):
+            traces.setdefault(span["trace_id"], []).append(span)
+        return traces
+
+
+xtracer = Tracer()